@@ -0,0 +1,92 @@
+"""
+Database configuration for project project.
+
+settings.DATABASES is built here from the environment: a tuned SQLite file by default, or PostgreSQL
+when DATABASE_URL is set (as Heroku Postgres sets it).
+"""
+
+import os
+from urllib.parse import unquote, urlparse
+
+# pragmas run on every new SQLite connection: WAL lets readers carry on while a write commits, NORMAL
+# sync is safe with WAL (a power cut can only lose the last commits, never corrupt the file), and a
+# memory map and larger page cache (64MB each) keep the hot pages out of read() calls
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=67108864',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+]
+# how long (in seconds) a write waits for the lock held by another writer before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT = 20
+
+
+def sqlite_config(name):
+    '''the settings of a tuned SQLite database file'''
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            # take the write lock when a transaction starts, rather than failing to upgrade a read lock
+            # half way through it (which the busy timeout can't wait out)
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # opening a SQLite connection is cheap, and persistent connections don't suit the ASGI server
+        'CONN_MAX_AGE': 0,
+    }
+
+
+def postgres_config(url, environ):
+    '''the settings of a PostgreSQL database from a postgres:// url, with a connection pool (DATABASE_POOL=1,
+    the better choice under the ASGI server) or persistent connections that are health checked before reuse'''
+    parts = urlparse(url)
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': unquote(parts.path.lstrip('/')),
+        'USER': unquote(parts.username or ''),
+        'PASSWORD': unquote(parts.password or ''),
+        'HOST': parts.hostname or '',
+        'PORT': parts.port or '',
+        'OPTIONS': {},
+    }
+    if environ.get('DATABASE_SSLMODE'):
+        config['OPTIONS']['sslmode'] = environ['DATABASE_SSLMODE']
+    if environ.get('DATABASE_POOL', '') in ('1', 'true'):
+        # a pool shared by the threads of each process (needs psycopg 3 with the pool extra)
+        config['OPTIONS']['pool'] = {
+            'min_size': int(environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+            'timeout': int(environ.get('DATABASE_POOL_TIMEOUT', 10)),
+        }
+        config['CONN_MAX_AGE'] = 0
+    else:
+        config['CONN_MAX_AGE'] = int(environ.get('DATABASE_CONN_MAX_AGE', 600))
+        config['CONN_HEALTH_CHECKS'] = True
+    return config
+
+
+def database_config(base_dir, environ=os.environ):
+    '''the default database: PostgreSQL if DATABASE_URL is set, otherwise db.sqlite3 (or SQLITE_PATH)'''
+    url = environ.get('DATABASE_URL')
+    if url and urlparse(url).scheme in ('postgres', 'postgresql'):
+        return postgres_config(url, environ)
+    return sqlite_config(environ.get('SQLITE_PATH', base_dir / 'db.sqlite3'))
+
+
+def replica_configs(environ=os.environ):
+    '''the read replicas, by alias: a SQLite copy of the primary (SQLITE_REPLICA_PATH, kept up to date by the
+    sync_replica command, for trying replicas locally) and/or PostgreSQL replicas (DATABASE_REPLICA_URLS,
+    comma separated)'''
+    replicas = {}
+    if environ.get('SQLITE_REPLICA_PATH'):
+        replicas['replica'] = sqlite_config(environ['SQLITE_REPLICA_PATH'])
+    urls = [url.strip() for url in environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    for number, url in enumerate(urls, start=1):
+        replicas[f'replica{number}'] = postgres_config(url, environ)
+    for config in replicas.values():
+        # the test database has no replicas, so tests read the replica aliases from the primary
+        config['TEST'] = {'MIRROR': 'default'}
+    return replicas
@@ -10,9 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import importlib.util
+import os
 from pathlib import Path
 from datetime import timedelta
 
+from .database import database_config, replica_configs
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -55,11 +59,18 @@ ACCOUNT_EMAIL_VERIFICATION = 'none'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # simplejwt's JWTAuthentication, with verified tokens cached for a few seconds
+        'project_app.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    # JSON encoded with orjson, and MessagePack (Accept: application/msgpack) when the msgpack package is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'project_app.renderers.FastJSONRenderer',
+        *(['project_app.renderers.MessagePackRenderer'] if importlib.util.find_spec('msgpack') else []),
+        *(['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
+    ],
 }
 
 CORS_ALLOWED_ORIGINS = [
@@ -109,6 +120,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'project_app.replicas.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'project.urls'
@@ -135,12 +147,19 @@ WSGI_APPLICATION = 'project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# a tuned db.sqlite3, or PostgreSQL when DATABASE_URL is set (see project/database.py)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
+    **replica_configs(),
 }
+# GET requests read from these (see project_app/replicas.py); writes, and the reads of a client that
+# has just written, go to the primary
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['project_app.replicas.ReplicaRouter']
+# how long (in seconds) a client's reads stay on the primary after it writes, and how far (in seconds)
+# a replica may lag before its reads go to the primary instead
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+REPLICA_MAX_LAG = int(os.environ.get('REPLICA_MAX_LAG', 5))
 
 
 # Password validation
@@ -183,6 +202,56 @@ MEDIA_URL = 'media/'
 
 MEDIA_ROOT = BASE_DIR / "media"
 
+# the cache used for cached api responses (see project_app/response_cache.py) and other derived data; each
+# process has its own in-memory cache unless REDIS_URL is set, which shares one cache between all of them.
+# 'shared' holds the few values every process (web and worker) must agree on: the versions of the cached responses'
+# tags, the version of the in-memory follow graph and the read-your-writes pins (see project_app/response_cache.py,
+# graph.py and replicas.py), so it is never in-memory: without Redis it is a folder of files, which the server's
+# processes share as long as they run on one machine
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('SHARED_CACHE_DIR', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+# the cache aliases holding the follow graph's version, the versions of the response cache's tags and the
+# read-your-writes pins
+FOLLOW_GRAPH_CACHE = 'shared'
+RESPONSE_CACHE_VERSION_ALIAS = 'shared'
+REPLICA_PIN_CACHE = 'shared'
+
+# media is served by project_app/views/media_views.py; behind nginx set this to 'x-accel-redirect' (with an internal
+# location at MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT), or behind apache to 'x-sendfile', so the proxy sends the files
+MEDIA_ACCEL = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# uploads are stored under the hash of their contents, so identical images are only stored once
+STORAGES = {
+    'default': {
+        'BACKEND': 'project_app.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -15,12 +15,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
+
+from project_app.views.media_views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     #include api views and media
     path('api/', include('project_app.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    re_path(r'^' + settings.MEDIA_URL.strip('/') + r'/(?P<path>.+)$', serve_media, name='media'),
+]
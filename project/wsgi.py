@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_wsgi_application()
+
+# load the in-memory follow graph before the first request (it is built in the background on first use if this fails)
+from django.db import DatabaseError
+from project_app import graph
+
+try:
+    graph.warm()
+except DatabaseError:
+    pass
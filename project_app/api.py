@@ -2,18 +2,29 @@
 # Author: Brinja Vogler (bvogler@bu.edu)
 # Description: a file containing all of the api views used for fetching data from the database (called by urls from the frontend)
 
-from django.http import JsonResponse
+import csv
+
+from rest_framework.response import Response
 
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
+from django.core.exceptions import ValidationError
 
 
-from .models import Post, InventoryItem, User, Pattern, Follow
-from .serializers import PostListSerializer, PostCreateSerializer, UserSerializer, InventoryListSerializer, InventoryCreateSerializer, PatternListSerializer, PatternCreateSerializer, FollowCreateSerializer, FollowerListSerializer, FollowingListSerializer
+from .authentication import CachedJWTAuthentication
+from .models import Post, InventoryItem, User, Pattern, Follow, Suggestion
+from .serializers import PostListSerializer, PostCreateSerializer, UserSerializer, InventoryListSerializer, InventoryCreateSerializer, PatternListSerializer, PatternCreateSerializer, FollowCreateSerializer, FollowerListSerializer, FollowingListSerializer, SuggestionListSerializer, UserSummarySerializer, USER_SUMMARY_COLUMNS, with_user_summary
+from .pagination import paginate
+from .timeline import timeline_page, timeline_summaries
+from .conditional import Validators, window_summary
+from .explore import explore_page
+from .streaming import stream_list, wants_stream
+from .search import search_patterns
+from . import inventory_import, typeahead
+from .response_cache import add_tags, cached_response
 
 #------POST GET VIEWS-------
 @api_view(['GET'])
@@ -21,87 +32,104 @@ from .serializers import PostListSerializer, PostCreateSerializer, UserSerialize
 @permission_classes([AllowAny])
 def get_all_posts(request):
     '''a function to get all posts for all  users'''
-    # order by most recent first, then serialize and send back
-    posts = Post.objects.all().order_by('-created_at')
-    serializer = PostListSerializer(posts, many=True)
-    return JsonResponse({
-        'data': serializer.data
-    })
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, with_user_summary(Post.objects, 'user'), PostListSerializer)
+
+    # answer a poll with 304 if the page hasn't changed since the client last fetched it
+    validators = Validators(request, [window_summary(request, Post.objects.all())])
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
+    # take one page, most recent first, then serialize and send back
+    posts, next_cursor = paginate(request, with_user_summary(Post.objects, 'user'))
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return validators.apply(Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
+    }))
 
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def get_all_but_user_posts(request):
     '''a function to get all posts except the authenticated user's'''
     # get the user from the request 
     user = request.user
-    # fetch posts but exclude the posts by the user, then serialize and send back
-    posts = Post.objects.exclude(user=user).order_by('-created_at')
-    serializer = PostListSerializer(posts, many=True)
-    return JsonResponse({
-        'data': serializer.data
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, with_user_summary(Post.objects, 'user').exclude(user=user), PostListSerializer)
+    # fetch a page of posts but exclude the posts by the user, then serialize and send back
+    posts, next_cursor = paginate(request, with_user_summary(Post.objects, 'user').exclude(user=user))
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
     })
 
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def get_following_posts(request):
     '''a function to get all posts by users the current user follows'''
     user = request.user
     # check for authentication
     if not user.is_authenticated:
-        return JsonResponse({"error": "Authentication is required"}, status=401)
+        return Response({"error": "Authentication is required"}, status=401)
     
-    # Filter posts by fetching following and retrieving only posts by users in the following list
-    following_users = Follow.objects.filter(follower=user).values_list('following', flat=True)
-    posts = Post.objects.filter(Q(user__in=following_users) | Q(user=user)).order_by('-created_at')
+    # answer a poll with 304 if the page hasn't changed and the user hasn't followed or unfollowed anyone since
+    validators = Validators(request, timeline_summaries(request, user), [user.follow_version])
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
+    # read a page of the user's materialized timeline (their own posts and the posts of everyone they follow)
+    posts, next_cursor = timeline_page(request, user)
 
     #serialize and send response
-    serializer = PostListSerializer(posts, many=True)
-    return JsonResponse({
-        'data': serializer.data
-    })
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return validators.apply(Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
+    }))
 
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def get_explore_posts(request):
     '''a function to get posts for the explore page for current user'''
     user = request.user
     # check for authentication
     if not user.is_authenticated:
-        return JsonResponse({"error": "Authentication is required"}, status=401)
-    
-    # filter posts based on the following relationships
-    following_users = Follow.objects.filter(follower=user).values_list('following', flat=True)
+        return Response({"error": "Authentication is required"}, status=401)
     
-    # exclude the posts by the current user and the users that the user is following
-    posts = Post.objects.exclude(user=user) 
-    posts = posts.exclude(user__in=following_users)
-    posts = posts.order_by('-created_at')
+    # take a page of the ranked explore pool, excluding the posts by the current user and the users they follow
+    posts, next_cursor = explore_page(request, user)
     
     # serialize and send response
-    serializer = PostListSerializer(posts, many=True)
-    return JsonResponse({
-        'data': serializer.data
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
     })
 
 @api_view(['POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def create_post(request):
     '''a function to create a post for an authenticated user'''
     user = request.user
     # check for authentication
     if not user.is_authenticated:
-        return JsonResponse({"error": "you must be authenticated to perform this"})
+        return Response({"error": "you must be authenticated to perform this"})
     # serialize the data using the post creation serializer
     serializer = PostCreateSerializer(data=request.data)
     # check if serilaized correctly and save, then send back post information
     if serializer.is_valid():
         post = serializer.save()
         print(post)
-        return JsonResponse({
+        return Response({
             "message": "Post created successfully!",
             "post": {
                 "id": str(post.id),
@@ -112,90 +140,110 @@ def create_post(request):
             }
         }, status=status.HTTP_201_CREATED)
     # otherwise send error response
-    return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 
 #-----PATTERN GET VIEWS-------
+@cached_response('patterns')
 @api_view(['GET'])
 @authentication_classes([])
 @permission_classes([AllowAny])
 def get_all_patterns(request):
     '''a function to get all patterns from the database'''
-    # sort by most recent
-    patterns = Pattern.objects.all().order_by('-created_at')
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, with_user_summary(Pattern.objects, 'creator'), PatternListSerializer)
+    # take one page, sorted by most recent
+    patterns, next_cursor = paginate(request, with_user_summary(Pattern.objects, 'creator'))
+    # the cached page also goes out of date when one of the creators shown edits their profile, or a pattern is saved
+    add_tags(*{f'user:{pattern.creator_id}' for pattern in patterns}, *{f'pattern:{pattern.id}' for pattern in patterns})
 
     # serialize the patterns and respond with the pattern list
-    serializer = PatternListSerializer(patterns, many=True)
-    return JsonResponse({
-        'data': serializer.data
+    serializer = PatternListSerializer(patterns, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
     })
 
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def get_all_but_user_patterns(request):
     '''a function to get all patterns but ones created by the authenticated user'''
     user = request.user
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, with_user_summary(Post.objects, 'user').exclude(user=user), PostListSerializer)
     # exclude the current user, serialize and send back
-    posts = Post.objects.exclude(user=user).order_by('-created_at')
-    serializer = PostListSerializer(posts, many=True)
-    return JsonResponse({
-        'data': serializer.data
+    posts, next_cursor = paginate(request, with_user_summary(Post.objects, 'user').exclude(user=user))
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
     })
 
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def get_following_patterns(request):
     '''a function to retrieve patterns created by users the authenticated user is following'''
     user = request.user
     # check for auth
     if not user.is_authenticated:
-        return JsonResponse({"error": "Authentication is required"}, status=401)
+        return Response({"error": "Authentication is required"}, status=401)
     
     # filter patterns based on the user's following
     following_users = Follow.objects.filter(follower=user).values_list('following', flat=True)
-    patterns = Pattern.objects.filter(creator__in=following_users).order_by('-created_at')
+    patterns = with_user_summary(Pattern.objects, 'creator').filter(creator__in=following_users)
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, patterns, PatternListSerializer)
+    patterns, next_cursor = paginate(request, patterns)
 
     # serialize and return patterns
-    serializer = PatternListSerializer(patterns, many=True)
-    return JsonResponse({
-        'data': serializer.data
+    serializer = PatternListSerializer(patterns, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
     })
 
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def get_explore_patterns(request):
     '''a function to fetch patterns created by other users the authenticated user does not follow'''
     user = request.user
     if not user.is_authenticated:
-        return JsonResponse({"error": "Authentication is required"}, status=401)
+        return Response({"error": "Authentication is required"}, status=401)
     
     # Filter patterns based on the following relationships
     following_users = Follow.objects.filter(follower=user).values_list('following', flat=True)
     
     # Exclude the patterns by the current user and the users that the user is following
-    patterns = Pattern.objects.exclude(creator=user)  # Exclude patterns from the user
+    patterns = with_user_summary(Pattern.objects, 'creator').exclude(creator=user)  # Exclude patterns from the user
     patterns = patterns.exclude(creator__in=following_users)  # Exclude patterns from users that the current user is following
-    patterns = patterns.order_by('-created_at')
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, patterns, PatternListSerializer)
+    patterns, next_cursor = paginate(request, patterns)
     
     # serialize and return
-    serializer = PatternListSerializer(patterns, many=True)
-    return JsonResponse({
-        'data': serializer.data
+    serializer = PatternListSerializer(patterns, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
     })
 
 @api_view(['POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def create_pattern(request, user_id):
     '''a function to create a pattern by the currently authenticated user'''
     user = request.user
     # check for auth
     if not user.is_authenticated:
-        return JsonResponse({"error": "you must be authenticated to perform this"})
+        return Response({"error": "you must be authenticated to perform this"})
     
     # use pattern creation serializer to create an instance of a pattern
     serializer = PatternCreateSerializer(data=request.data)
@@ -204,57 +252,58 @@ def create_pattern(request, user_id):
     if serializer.is_valid():
         post = serializer.save()
         print(post)
-        return JsonResponse({
+        return Response({
             "message": "Pattern created successfully!",
         }, status=status.HTTP_201_CREATED)
     # otherwise reply with error
-    return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([]) 
 def get_patterns_with_search(request):
-    '''a function to get patterns that match a search query provided by the request'''
+    '''a function to get patterns that match a search query provided by the request, best match first'''
     user = request.user 
     # check for authentication
     if not user.is_authenticated:
-        return JsonResponse({"error": "you must be authenticated to perform this"})
+        return Response({"error": "you must be authenticated to perform this"})
     
-    # extract the query from the search params
+    # extract the query and optional difficulty filter from the search params
     search_query = request.GET.get('search_query', None)
-    # start with all patterns
-    patterns = Pattern.objects.all()
-    # exclude user's own patterns
-    patterns = patterns.exclude(creator=user)
-    
-    # if there is a search query, filter the patterns by name and description
-    if search_query:
-        patterns = patterns.filter(
-            Q(name__icontains=search_query) | Q(description__icontains=search_query)
-        )
+    difficulty = request.GET.get('difficulty', None)
 
-    # order by difficulty
-    patterns = patterns.order_by('difficulty')
+    # if there is a search query, look it up in the full-text index (ranked by relevance)
+    if search_query:
+        patterns, next_cursor = search_patterns(request, user, search_query, difficulty)
+    else:
+        # otherwise list all patterns but the user's own, ordered by difficulty
+        patterns = with_user_summary(Pattern.objects, 'creator').exclude(creator=user)
+        if difficulty:
+            patterns = patterns.filter(difficulty=difficulty)
+        patterns, next_cursor = paginate(request, patterns, ordering=('difficulty', 'id'))
     # serialize and return
-    serializer = PatternListSerializer(patterns, many=True)
-    return JsonResponse({'data': serializer.data})
+    serializer = PatternListSerializer(patterns, many=True, context={'request': request})
+    return Response({'data': serializer.data, 'next_cursor': next_cursor})
 
+@cached_response('pattern:{pattern_id}')
 @api_view(['GET'])
 @authentication_classes([])
 @permission_classes([AllowAny])
 def get_pattern_by_id(request, pattern_id):
     '''retrieve a pattern by its id to display all of its information'''
     # get the object by id, serialize and return
-    pattern = get_object_or_404(Pattern, id=pattern_id)
-    serializer = PatternListSerializer(pattern)
-    return JsonResponse({
+    pattern = get_object_or_404(with_user_summary(Pattern.objects, 'creator'), id=pattern_id)
+    add_tags(f'user:{pattern.creator_id}')
+    serializer = PatternListSerializer(pattern, context={'request': request})
+    return Response({
         'data': serializer.data
     })
 
 
 
 #-------USER VIEWS---------
+@cached_response('user:{user_id}')
 @api_view(['GET'])
 @authentication_classes([])
 @permission_classes([AllowAny])
@@ -262,33 +311,47 @@ def get_user_by_id(request, user_id):
     '''a function to get a user's information by their id'''
     # retrieve the object, serialize and return
     user = get_object_or_404(User, id=user_id)
-    serializer = UserSerializer(user)
-    return JsonResponse({
+    serializer = UserSerializer(user, context={'request': request})
+    return Response({
         'data': serializer.data
     })
 
+@cached_response('user:{user_id}')
 @api_view(['GET'])
 @authentication_classes([])
 @permission_classes([AllowAny])
 def get_user_posts(request, user_id):
     '''a function to get a specific user's posts'''
-    # filter by matching id with user_id, serialize and return
-    posts = Post.objects.filter(user=user_id).order_by('-created_at')
-    serializer = PostListSerializer(posts, many=True)
-    return JsonResponse({
-        'data': serializer.data
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, with_user_summary(Post.objects, 'user').filter(user=user_id), PostListSerializer)
+    # filter by matching id with user_id, take a page, serialize and return
+    posts, next_cursor = paginate(request, with_user_summary(Post.objects, 'user').filter(user=user_id))
+    # the like, comment and save counts shown change without the post being saved
+    add_tags(*{f'post:{post.id}' for post in posts})
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
     })
 
+@cached_response('user:{user_id}')
 @api_view(['GET'])
 @authentication_classes([])
 @permission_classes([AllowAny])
 def get_user_patterns(request, user_id):
     '''a function to get all patterns created by a specific user'''
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, with_user_summary(Pattern.objects, 'creator').filter(creator=user_id), PatternListSerializer)
     # match the user_id parameter with creator of patterns
-    patterns = Pattern.objects.filter(creator=user_id).order_by('-created_at')
-    serializer = PatternListSerializer(patterns, many=True)
-    return JsonResponse({
-        'data': serializer.data
+    patterns, next_cursor = paginate(request, with_user_summary(Pattern.objects, 'creator').filter(creator=user_id))
+    # the save counts shown change without the pattern being saved
+    add_tags(*{f'pattern:{pattern.id}' for pattern in patterns})
+    serializer = PatternListSerializer(patterns, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
     })
 
 @api_view(['GET'])
@@ -296,11 +359,15 @@ def get_user_patterns(request, user_id):
 @permission_classes([AllowAny])
 def get_user_followers(request, user_id):
     '''a function to retrieve all of a specific user's followers'''
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, with_user_summary(Follow.objects, 'follower').filter(following=user_id), FollowerListSerializer, ordering=('id',))
     # filter the follow objects that FOLLOW the requested user
-    follows = Follow.objects.filter(following=user_id)
-    serializer = FollowerListSerializer(follows, many=True)
-    return JsonResponse({
-        'data': serializer.data
+    follows, next_cursor = paginate(request, with_user_summary(Follow.objects, 'follower').filter(following=user_id), ordering=('id',))
+    serializer = FollowerListSerializer(follows, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
     })
 
 #------FOLLOW VIEWS---------
@@ -310,15 +377,19 @@ def get_user_followers(request, user_id):
 @permission_classes([AllowAny])
 def get_user_following(request, user_id):
     '''a function to retrieve all of a specific user's following'''
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, with_user_summary(Follow.objects, 'following').filter(follower=user_id), FollowingListSerializer, ordering=('id',))
     # filter the follow objects that the user FOLLOWS
-    follows = Follow.objects.filter(follower=user_id)
-    serializer = FollowingListSerializer(follows, many=True)
-    return JsonResponse({
-        'data': serializer.data
+    follows, next_cursor = paginate(request, with_user_summary(Follow.objects, 'following').filter(follower=user_id), ordering=('id',))
+    serializer = FollowingListSerializer(follows, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
     })
 
 @api_view(['PUT'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def update_user(request):
     '''a function to update the user's information (just avatar, link, and bio)'''
@@ -326,7 +397,7 @@ def update_user(request):
 
     # check for authentication
     if not user.is_authenticated:
-        return JsonResponse({"error": "you must be authenticated to perform this"})
+        return Response({"error": "you must be authenticated to perform this"})
     
     # retrieve the avatar file, link, and bio from the request (empty is okay)
     avatar = request.FILES.get('avatar')
@@ -339,14 +410,14 @@ def update_user(request):
     user.bio = bio
     user.link = link
 
-    # save the user's information and return the details
-    user.save()
-    serializer = UserSerializer(user)
-    return JsonResponse({'data': serializer.data})
+    # save the user's information (only the fields edited here) and return the details
+    user.save(update_fields=['avatar', 'bio', 'link', 'updated_at'])
+    serializer = UserSerializer(user, context={'request': request})
+    return Response({'data': serializer.data})
 
 
 @api_view(['POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def create_follow(request, other_id):
     '''a function to create a follow object between current authenticated user and 
@@ -354,13 +425,13 @@ def create_follow(request, other_id):
     user = request.user
     # check for authentication
     if not user.is_authenticated:
-        return JsonResponse({"error": "You must be authenticated to perform this"}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({"error": "You must be authenticated to perform this"}, status=status.HTTP_401_UNAUTHORIZED)
     
     # ensure the other user exists
     try:
         other_user = User.objects.get(id=other_id)
     except User.DoesNotExist:
-        return JsonResponse({"error": "User to follow does not exist"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"error": "User to follow does not exist"}, status=status.HTTP_404_NOT_FOUND)
     
     # pass data to serializer which will populate the required fields
     data = {'following': other_id}
@@ -368,27 +439,28 @@ def create_follow(request, other_id):
     
     # if the serializer is valid, save the follow and return a resopnse indicating success
     if serializer.is_valid():
+        # the follow and the follower/following counters are written in one transaction (see FollowCreateSerializer)
         follow = serializer.save()  # Save the follow instance
-        return JsonResponse({
+        return Response({
             "message": "Successfully followed!",
             "follow_id": str(follow.id),  # Optionally return the follow ID
         }, status=status.HTTP_201_CREATED)
     # else return an error
-    return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([]) 
 def search_users(request):
     '''a function which allows the current user to search for other users in the database'''
     user = request.user 
     # ensure the user is authenticated
     if not user.is_authenticated:
-        return JsonResponse({"error": "you must be authenticated to perform this"})
+        return Response({"error": "you must be authenticated to perform this"})
     # retrieve the search query from the request params, default to None if not found
     search_query = request.GET.get('search_query', None)
     # start with all patterns
-    users = User.objects.all()
+    users = User.objects.only(*USER_SUMMARY_COLUMNS)
     # exclude self
     users = users.exclude(id=user.id)
     # if the search query exists, filter the users by if their username or name contains the query
@@ -396,11 +468,51 @@ def search_users(request):
         users = users.filter(
             Q(name__icontains=search_query) | Q(username__icontains=search_query)
         )
-    # serialize the users and return the list
-    serializer = UserSerializer(users, many=True)
-    return JsonResponse({'data': serializer.data})
+    # take a page ordered by username, serialize the users and return the list
+    users, next_cursor = paginate(request, users, ordering=('username', 'id'))
+    serializer = UserSummarySerializer(users, many=True, context={'request': request})
+    return Response({'data': serializer.data, 'next_cursor': next_cursor})
 
 
+@api_view(['GET'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([])
+def typeahead_users(request):
+    '''a function which suggests the top few users matching what the current user has typed so far'''
+    user = request.user
+    # ensure the user is authenticated
+    if not user.is_authenticated:
+        return Response({"error": "you must be authenticated to perform this"})
+    # read the partial query and how many suggestions to return
+    search_query = request.GET.get('search_query', '')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', typeahead.DEFAULT_RESULTS)), typeahead.MAX_RESULTS))
+    except ValueError:
+        limit = typeahead.DEFAULT_RESULTS
+    # look the query up in the typeahead index (excluding self), serialize and return
+    users = typeahead.suggest(search_query, user.id, limit)
+    serializer = UserSummarySerializer(users, many=True, context={'request': request})
+    return Response({'data': serializer.data})
+
+@api_view(['GET'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([])
+def get_user_suggestions(request):
+    '''a function to get a page of the accounts suggested to the current user ("people you may know")'''
+    user = request.user
+    # ensure the user is authenticated
+    if not user.is_authenticated:
+        return Response({"error": "Authentication is required"}, status=401)
+    # read a page of the precomputed suggestions, best first, leaving out anyone followed since they were computed
+    following_users = Follow.objects.filter(follower=user).values('following')
+    suggestions = with_user_summary(Suggestion.objects, 'suggested').filter(user=user).exclude(suggested__in=following_users)
+    suggestions, next_cursor = paginate(request, suggestions, ordering=('-score', 'suggested_id'))
+    serializer = SuggestionListSerializer(suggestions, many=True, context={'request': request})
+    return Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
+    })
+
 
 #--------INVENTORY VIEWS-------
 @api_view(['GET'])
@@ -408,44 +520,123 @@ def search_users(request):
 @permission_classes([AllowAny])
 def get_inventory(request, user_id):
     '''a function to retrieve the inventory of a user'''
-    # filter by the user_id parameter and order by the type of item and how recent it was
-    items = InventoryItem.objects.filter(user=user_id).order_by('created_at', 'item_type')
-    serializer = InventoryListSerializer(items, many=True)
-    return JsonResponse({
-        'data': serializer.data
-    })
+    # with ?stream=1, send every row instead of one page
+    if wants_stream(request):
+        return stream_list(request, with_user_summary(InventoryItem.objects, 'user').filter(user=user_id), InventoryListSerializer, ordering=('created_at', 'id'))
+
+    # answer a poll with 304 if the page hasn't changed since the client last fetched it
+    validators = Validators(request, [window_summary(request, InventoryItem.objects.filter(user=user_id), ('created_at', 'id'))])
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
+    # filter by the user_id parameter and take a page in the order the items were added
+    items, next_cursor = paginate(request, with_user_summary(InventoryItem.objects, 'user').filter(user=user_id), ordering=('created_at', 'id'))
+    serializer = InventoryListSerializer(items, many=True, context={'request': request})
+    return validators.apply(Response({
+        'data': serializer.data,
+        'next_cursor': next_cursor,
+    }))
 
 @api_view(['POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def create_inventory_item(request, user_id):
     '''a function to create an inventory item for the authenticated user'''
     user = request.user
     # check for authentication
     if not user.is_authenticated:
-        return JsonResponse({"error": "you must be authenticated to perform this"})
+        return Response({"error": "you must be authenticated to perform this"})
     
     # use inventory creation serializer to validate data, and save if so
     serializer = InventoryCreateSerializer(data=request.data)
     if serializer.is_valid():
         post = serializer.save()
         print(post)
-        return JsonResponse({
+        return Response({
             "message": "Item created successfully!",
         }, status=status.HTTP_201_CREATED)
     # return error
-    return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['DELETE'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 @permission_classes([])
 def delete_inventory_item(request, inventory_id):
     ''' a function to delete a specified inventory item from the user's inventory'''
     user = request.user
     if not user.is_authenticated:
-        return JsonResponse({"error": "you must be authenticated to perform this"})
+        return Response({"error": "you must be authenticated to perform this"})
     # retrieve object and delete
     item = get_object_or_404(InventoryItem, id=inventory_id)
     item.delete()
     # return success message
-    return JsonResponse({"message": "item successfully deleted"})
\ No newline at end of file
+    return Response({"message": "item successfully deleted"})
+
+# the content types a bulk import can be sent as, and the format each is read as
+IMPORT_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+}
+
+@api_view(['POST'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([])
+def bulk_import_inventory(request):
+    '''a function to add many items to the authenticated user's inventory at once, from CSV or JSON lines
+    sent as the request body, or as a multipart upload ('file', plus 'images' the rows can name)'''
+    user = request.user
+    if not user.is_authenticated:
+        return Response({"error": "you must be authenticated to perform this"})
+
+    content_type = request.content_type.split(';')[0].strip()
+    images = {}
+    if content_type == 'multipart/form-data':
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "no file was uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = 'csv' if upload.name.lower().endswith('.csv') else 'jsonl'
+        # the upload is read a line at a time, rather than all at once
+        lines = upload
+        images = {image.name: image for image in request.FILES.getlist('images')}
+    elif content_type in IMPORT_FORMATS:
+        file_format = IMPORT_FORMATS[content_type]
+        lines = request.stream or []
+    else:
+        return Response({"error": f"unsupported content type {content_type}"}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    try:
+        created, errors = inventory_import.import_items(user, lines, file_format, images)
+    except (inventory_import.InvalidImport, UnicodeDecodeError, csv.Error) as error:
+        return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    # the valid rows are imported even if others had errors
+    return Response({
+        "created": created,
+        "errors": errors,
+    }, status=status.HTTP_201_CREATED if created or not errors else status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([])
+def bulk_delete_inventory(request):
+    '''a function to delete many of the authenticated user's inventory items at once (given as {"ids": [...]})'''
+    user = request.user
+    if not user.is_authenticated:
+        return Response({"error": "you must be authenticated to perform this"})
+    # the ids can be sent as a JSON list, or as repeated form fields
+    if hasattr(request.data, 'getlist'):
+        item_ids = request.data.getlist('ids')
+    else:
+        item_ids = request.data.get('ids') if isinstance(request.data, dict) else None
+    if not isinstance(item_ids, list):
+        return Response({"error": "ids must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        # only the user's own items are deleted; any other id is reported as not found
+        deleted, not_found = inventory_import.delete_items(user, [str(item_id) for item_id in item_ids])
+    except (inventory_import.InvalidImport, ValidationError) as error:
+        return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        "deleted": deleted,
+        "not_found": not_found,
+    })
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProjectAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'project_app'
+
+    def ready(self):
+        # connect the receivers that keep derived data in sync with the models, and register the background tasks
+        from . import signals, tasks
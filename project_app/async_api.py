@@ -0,0 +1,136 @@
+# File: async_api.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing async versions of the read-only api views, for the ASGI server: they read with
+# the async ORM, so a slow client or a slow query waits on the event loop instead of holding a worker
+
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .authentication import AsyncJWTAuthentication
+from .conditional import Validators, awindow_summary
+from .explore import explore_page
+from .models import Follow, Pattern, Post, User
+from .pagination import InvalidCursor, apaginate
+from .renderers import render_response
+from .serializers import FollowerListSerializer, FollowingListSerializer, PatternListSerializer, PostListSerializer, UserSerializer, with_user_summary
+from .timeline import timeline_page, timeline_summaries
+
+authentication = AsyncJWTAuthentication()
+
+
+def async_api_view(authenticated=False):
+    '''makes an async function a read-only api view: the user (for authenticated views) is set on the request,
+    and bad tokens, bad cursors and missing objects are answered like the api views answer them'''
+    def decorator(view):
+        @require_safe
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if authenticated:
+                    result = await authentication.aauthenticate(request)
+                    if result is None:
+                        return render_response(request, {'error': 'Authentication is required'}, status=401)
+                    request.user, request.auth = result
+                return await view(request, *args, **kwargs)
+            except (AuthenticationFailed, InvalidToken) as error:
+                return render_response(request, {'detail': str(error.detail)}, status=401)
+            except InvalidCursor as error:
+                return render_response(request, error.detail, status=400)
+            except Http404:
+                return render_response(request, {'detail': 'Not found.'}, status=404)
+        return wrapper
+    return decorator
+
+
+#------POST VIEWS-------
+@async_api_view()
+async def get_all_posts(request):
+    '''a function to get all posts for all users'''
+    # answer a poll with 304 if the page hasn't changed since the client last fetched it
+    validators = Validators(request, [await awindow_summary(request, Post.objects.all())])
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
+    # take one page, most recent first, then serialize and send back
+    posts, next_cursor = await apaginate(request, with_user_summary(Post.objects, 'user'))
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return validators.apply(render_response(request, {
+        'data': serializer.data,
+        'next_cursor': next_cursor,
+    }))
+
+@async_api_view(authenticated=True)
+async def get_following_posts(request):
+    '''a function to get all posts by users the current user follows'''
+    user = request.user
+    # the timeline merges fanned out and popular posts with the follow graph, so it runs in a worker thread
+    validators = Validators(request, await sync_to_async(timeline_summaries)(request, user), [user.follow_version])
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
+    posts, next_cursor = await sync_to_async(timeline_page)(request, user)
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return validators.apply(render_response(request, {
+        'data': serializer.data,
+        'next_cursor': next_cursor,
+    }))
+
+@async_api_view(authenticated=True)
+async def get_explore_posts(request):
+    '''a function to get posts for the explore page for current user'''
+    posts, next_cursor = await sync_to_async(explore_page)(request, request.user)
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return render_response(request, {
+        'data': serializer.data,
+        'next_cursor': next_cursor,
+    })
+
+
+#-----PATTERN VIEWS-------
+@async_api_view()
+async def get_pattern_by_id(request, pattern_id):
+    '''a function to get a pattern's information by its id'''
+    pattern = await aget_object_or_404(with_user_summary(Pattern.objects, 'creator'), id=pattern_id)
+    serializer = PatternListSerializer(pattern, context={'request': request})
+    return render_response(request, {
+        'data': serializer.data
+    })
+
+
+#-------USER VIEWS---------
+@async_api_view()
+async def get_user_by_id(request, user_id):
+    '''a function to get a user's information by their id'''
+    user = await aget_object_or_404(User, id=user_id)
+    serializer = UserSerializer(user, context={'request': request})
+    return render_response(request, {
+        'data': serializer.data
+    })
+
+@async_api_view()
+async def get_user_followers(request, user_id):
+    '''a function to retrieve a page of a specific user's followers'''
+    follows, next_cursor = await apaginate(request, with_user_summary(Follow.objects, 'follower').filter(following=user_id), ordering=('id',))
+    serializer = FollowerListSerializer(follows, many=True, context={'request': request})
+    return render_response(request, {
+        'data': serializer.data,
+        'next_cursor': next_cursor,
+    })
+
+@async_api_view()
+async def get_user_following(request, user_id):
+    '''a function to retrieve a page of the users a specific user follows'''
+    follows, next_cursor = await apaginate(request, with_user_summary(Follow.objects, 'following').filter(follower=user_id), ordering=('id',))
+    serializer = FollowingListSerializer(follows, many=True, context={'request': request})
+    return render_response(request, {
+        'data': serializer.data,
+        'next_cursor': next_cursor,
+    })
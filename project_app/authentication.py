@@ -0,0 +1,120 @@
+# File: authentication.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the JWT authentication of the api and async views: verified tokens and their
+# users are kept in a small per-process cache for a few seconds, so repeat requests skip the signature check and
+# the user query (the async views check tokens the same way, but load users with the async ORM)
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+# how long (in seconds) a verified token is trusted without asking the database again; changes made to a user
+# through this process drop their tokens straight away, other processes see them once the entries expire
+TOKEN_CACHE_TTL = getattr(settings, 'TOKEN_CACHE_TTL', 30)
+# the most tokens kept per process (the least recently used are dropped first)
+TOKEN_CACHE_SIZE = getattr(settings, 'TOKEN_CACHE_SIZE', 10000)
+
+# {raw token: (when the entry expires, user, validated token)}, least recently used first
+verified_tokens = OrderedDict()
+lock = threading.Lock()
+
+
+def cached_user(raw_token):
+    '''the (user, validated token) of a token verified less than TOKEN_CACHE_TTL seconds ago, else None; the
+    user is a copy, so a view changing request.user can't change the cached one'''
+    with lock:
+        entry = verified_tokens.get(raw_token)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del verified_tokens[raw_token]
+            return None
+        verified_tokens.move_to_end(raw_token)
+    return copy.copy(entry[1]), entry[2]
+
+
+def remember(raw_token, user, validated_token):
+    '''caches a verified token's user, until TOKEN_CACHE_TTL passes or the token expires (whichever is first)'''
+    lifetime = min(TOKEN_CACHE_TTL, validated_token.get('exp', 0) - time.time())
+    if lifetime <= 0:
+        return
+    with lock:
+        verified_tokens[raw_token] = (time.monotonic() + lifetime, copy.copy(user), validated_token)
+        verified_tokens.move_to_end(raw_token)
+        while len(verified_tokens) > TOKEN_CACHE_SIZE:
+            verified_tokens.popitem(last=False)
+
+
+def forget_user(user_id):
+    '''drops every cached token of a user (called when the user is saved, deleted, follows or logs out)'''
+    with lock:
+        for raw_token in [token for token, entry in verified_tokens.items() if entry[1].pk == user_id]:
+            del verified_tokens[raw_token]
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    '''JWTAuthentication that answers repeat requests with the same token from the token cache'''
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        cached = cached_user(raw_token)
+        if cached is not None:
+            return cached
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        remember(raw_token, user, validated_token)
+        return user, validated_token
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    '''JWTAuthentication for plain async django views: await aauthenticate(request) instead of authenticate()'''
+
+    async def aauthenticate(self, request):
+        '''returns (user, token) for a request with a valid bearer token, None for one without a token, and
+        raises AuthenticationFailed (or InvalidToken) for a bad token or user'''
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        cached = cached_user(raw_token)
+        if cached is not None:
+            return cached
+        # checking the signature and expiry needs no database
+        validated_token = self.get_validated_token(raw_token)
+        user = await self.aget_user(validated_token)
+        remember(raw_token, user, validated_token)
+        return user, validated_token
+
+    async def aget_user(self, validated_token):
+        '''get_user, reading the user with the async ORM'''
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as error:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from error
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as error:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found') from error
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
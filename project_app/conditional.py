@@ -0,0 +1,84 @@
+# File: conditional.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the conditional GET support for list views: a cheap validator is computed
+# for the requested page before anything is serialized, so a client polling an unchanged list gets a 304
+
+import hashlib
+import json
+
+from django.db.models import Count, Max, Min
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .images import preferred_format
+from .pagination import page_window
+from .renderers import response_format
+
+
+def summary_aggregates(updated):
+    '''the aggregates window_summary computes: the newest and oldest created_at, the row count, and the latest
+    change to each of the updated fields'''
+    aggregates = {'latest': Max('created_at'), 'earliest': Min('created_at'), 'rows': Count('pk')}
+    aggregates.update({f'updated_{number}': Max(field) for number, field in enumerate(updated)})
+    return aggregates
+
+
+def latest_change(summary, updated):
+    '''folds the latest change to each of the updated fields into one value, summary['changed']'''
+    changes = [summary.pop(f'updated_{number}') for number in range(len(updated))]
+    summary['changed'] = max((change for change in changes if change is not None), default=None)
+    return summary
+
+
+def window_summary(request, queryset, ordering=('-created_at', '-id'), updated=('updated_at', 'user__updated_at')):
+    '''summarizes the rows on the requested page in one aggregate query: their newest and oldest created_at, how
+    many there are, and the latest updated_at of the rows and of the related rows shown with them (the user
+    embedded in each row, by default)
+
+    a new row raises the newest, a deleted one changes the count or, when a row from the next page moves up,
+    the oldest; an edit to a row or its user (a like counted, a new avatar, resized images) raises the latest
+    change'''
+    summary = page_window(request, queryset, ordering).aggregate(**summary_aggregates(updated))
+    return latest_change(summary, updated)
+
+
+async def awindow_summary(request, queryset, ordering=('-created_at', '-id'), updated=('updated_at', 'user__updated_at')):
+    '''window_summary, with the async ORM'''
+    summary = await page_window(request, queryset, ordering).aaggregate(**summary_aggregates(updated))
+    return latest_change(summary, updated)
+
+
+class Validators:
+    '''the etag and last modified time of a list response, built from page summaries and versions'''
+
+    def __init__(self, request, summaries, versions=()):
+        self.request = request
+        # the page was last modified by its newest row, or by the latest edit to one of its rows (sent to clients,
+        # but not trusted on its own to answer with a 304, see not_modified)
+        latest = [summary[key] for summary in summaries for key in ('latest', 'changed') if summary[key] is not None]
+        self.last_modified = max(latest) if latest else None
+        # the query string (cursor, limit), image format and response format pick out what is on the page and how it is shown
+        raw = json.dumps(
+            [[str(value) for value in summary.values()] for summary in summaries]
+            + [str(version) for version in versions]
+            + [request.META.get('QUERY_STRING', ''), preferred_format(request), response_format(request)],
+        )
+        self.etag = '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+    def not_modified(self):
+        '''a 304 response if the client's copy (by If-None-Match) is current, otherwise None
+
+        If-Modified-Since alone is never enough: deleting a row (or unfollowing an author) changes the page
+        without making anything on it newer, which only the etag (made from the row count) notices'''
+        response = get_conditional_response(self.request, etag=self.etag)
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response):
+        '''adds the validators to a response, telling clients to revalidate before reusing it'''
+        response['ETag'] = self.etag
+        if self.last_modified:
+            response['Last-Modified'] = http_date(self.last_modified.timestamp())
+        response['Cache-Control'] = 'private, no-cache'
+        return response
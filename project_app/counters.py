@@ -0,0 +1,71 @@
+# File: counters.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the denormalized counter columns (followers, likes, comments, saves):
+# they are changed with F() updates as relationships are added and removed, and can be repaired in batches
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Follow, Like, Pattern, Post, SavedPattern, SavedPost, User
+
+# each counter: (counted model, counter field, relationship model, the relationship's foreign key to the counted model)
+COUNTERS = [
+    (User, 'follower_count', Follow, 'following'),
+    (User, 'following_count', Follow, 'follower'),
+    (Post, 'like_count', Like, 'post'),
+    (Post, 'comment_count', Comment, 'post'),
+    (Post, 'save_count', SavedPost, 'post'),
+    (Pattern, 'save_count', SavedPattern, 'pattern'),
+]
+
+BATCH_SIZE = 1000
+
+
+def relationship_changed(instance, amount):
+    '''adds amount (1 or -1) to every counter the relationship row counts towards; the update runs in the
+    caller's transaction, and as a single UPDATE ... SET n = n + 1 concurrent changes can't be lost'''
+    for model, field, relationship, foreign_key in COUNTERS:
+        if not isinstance(instance, relationship):
+            continue
+        counted = model.objects.filter(pk=getattr(instance, foreign_key + '_id'))
+        if amount < 0:
+            # never take a drifted counter below zero
+            counted = counted.filter(**{field + '__gte': -amount})
+        # update() skips auto_now, so updated_at (which list etags are made from) is set here
+        counted.update(**{field: F(field) + amount, 'updated_at': timezone.now()})
+
+
+def actual_count(field, relationship, foreign_key):
+    '''an expression counting a row's relationship rows, for recomputing a counter in the database'''
+    rows = (
+        relationship.objects.filter(**{foreign_key: OuterRef('pk')})
+        .order_by().values(foreign_key).annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(rows), Value(0))
+
+
+def reconcile(batch_size=BATCH_SIZE):
+    '''recounts every counter in batches of rows, fixing the ones that drifted; returns {counter name: rows fixed}'''
+    fixed = {}
+    for model, field, relationship, foreign_key in COUNTERS:
+        name = f'{model.__name__}.{field}'
+        fixed[name] = 0
+        ids = model.objects.order_by('pk').values_list('pk', flat=True)
+        last_id = None
+        while True:
+            batch = ids.filter(pk__gt=last_id) if last_id is not None else ids
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            drifted = list(
+                model.objects.filter(pk__in=batch)
+                .annotate(actual=actual_count(field, relationship, foreign_key))
+                .exclude(**{field: F('actual')})
+                .values_list('pk', flat=True)
+            )
+            if drifted:
+                model.objects.filter(pk__in=drifted).update(**{field: actual_count(field, relationship, foreign_key), 'updated_at': timezone.now()})
+                fixed[name] += len(drifted)
+    return fixed
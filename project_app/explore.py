@@ -0,0 +1,127 @@
+# File: explore.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the explore engine: a bounded pool of posts ranked by engagement
+# and recency, kept up to date as posts are liked, commented on and saved
+
+import math
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ExploreCandidate, Follow, Post
+from .pagination import paginate
+from .serializers import with_user_summary
+
+# the most posts kept in the pool, and how far back a full refresh looks for candidates
+POOL_SIZE = getattr(settings, 'EXPLORE_POOL_SIZE', 5000)
+REFRESH_WINDOW = timedelta(days=getattr(settings, 'EXPLORE_REFRESH_DAYS', 14))
+# new posts grow the pool past POOL_SIZE; the worker trims it back every this many seconds
+TRIM_INTERVAL = getattr(settings, 'EXPLORE_TRIM_INTERVAL', 60)
+# a post's score halves every HALF_LIFE hours
+HALF_LIFE_HOURS = getattr(settings, 'EXPLORE_HALF_LIFE_HOURS', 24)
+DECAY = math.log(2) / (HALF_LIFE_HOURS * 3600)
+
+# how much each kind of engagement counts towards a post's score
+LIKE_WEIGHT = 1
+COMMENT_WEIGHT = 2
+SAVE_WEIGHT = 3
+
+BATCH_SIZE = 1000
+ORDERING = ('-rank', '-post_id')
+
+# when this process last trimmed the pool
+last_trim = float('-inf')
+
+
+def rank_for(created_at, likes, comments, saves):
+    '''ranks a post by engagement * 2^(-age / half life)
+
+    taking the log, that is log(engagement) + DECAY * created_at - DECAY * now; the last term
+    is the same for every post, so it is dropped and a post's rank only changes when its
+    engagement does (no need to periodically rescore the whole pool as time passes)'''
+    engagement = 1 + LIKE_WEIGHT * likes + COMMENT_WEIGHT * comments + SAVE_WEIGHT * saves
+    return math.log(engagement) + DECAY * created_at.timestamp()
+
+
+def add_post(post):
+    '''adds a new post to the pool (it has no engagement yet, so it ranks on recency alone); the pool is
+    trimmed back to POOL_SIZE by the worker (see trim)'''
+    ExploreCandidate.objects.create(post=post, author_id=post.user_id, rank=rank_for(post.created_at, 0, 0, 0))
+
+
+def rescore_post(post_id):
+    '''updates the rank of a post in the pool after its engagement changed (posts outside the pool wait for the next refresh)'''
+    row = ExploreCandidate.objects.filter(post=post_id).values_list(
+        'post__created_at', 'post__like_count', 'post__comment_count', 'post__save_count',
+    ).first()
+    if row is None:
+        return
+    ExploreCandidate.objects.filter(post=post_id).update(rank=rank_for(*row))
+
+
+def refresh_pool():
+    '''rebuilds the pool from the posts made within the refresh window, keeping the POOL_SIZE best ranked'''
+    since = timezone.now() - REFRESH_WINDOW
+    posts = Post.objects.filter(created_at__gte=since).values_list(
+        'id', 'user_id', 'created_at', 'like_count', 'comment_count', 'save_count',
+    )
+
+    candidates = []
+    batch = []
+    for row in posts.iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            candidates += rank_batch(batch)
+            # only ever hold on to the best POOL_SIZE candidates
+            candidates = sorted(candidates, key=lambda candidate: candidate.rank, reverse=True)[:POOL_SIZE]
+            batch = []
+    candidates += rank_batch(batch)
+    candidates = sorted(candidates, key=lambda candidate: candidate.rank, reverse=True)[:POOL_SIZE]
+
+    with transaction.atomic():
+        ExploreCandidate.objects.all().delete()
+        ExploreCandidate.objects.bulk_create(candidates, batch_size=BATCH_SIZE)
+    return len(candidates)
+
+
+def rank_batch(rows):
+    '''builds (without saving) the pool entries for a batch of (post id, author id, created_at, likes, comments, saves) rows'''
+    return [
+        ExploreCandidate(post_id=post_id, author_id=author_id, rank=rank_for(created_at, *counts))
+        for post_id, author_id, created_at, *counts in rows
+    ]
+
+
+def trim():
+    '''trims the pool, at most every TRIM_INTERVAL; called by the worker loop'''
+    global last_trim
+    if time.monotonic() - last_trim < TRIM_INTERVAL:
+        return 0
+    last_trim = time.monotonic()
+    return trim_pool()
+
+
+def trim_pool():
+    '''drops the lowest ranked posts once the pool has grown past POOL_SIZE'''
+    cutoff = list(ExploreCandidate.objects.order_by(*ORDERING).values_list('rank', flat=True)[POOL_SIZE:POOL_SIZE + 1])
+    if not cutoff:
+        return 0
+    deleted, _ = ExploreCandidate.objects.filter(rank__lte=cutoff[0]).delete()
+    return deleted
+
+
+def explore_page(request, user):
+    '''returns one page of the explore pool for the user (a list of posts) and the cursor for the next page
+
+    only the pool is scanned, so the cost does not depend on the size of the Post table'''
+    following_users = Follow.objects.filter(follower=user).values_list('following', flat=True)
+    candidates = (
+        with_user_summary(ExploreCandidate.objects, 'post__user')
+        .exclude(author=user)
+        .exclude(author__in=following_users)
+    )
+    candidates, next_cursor = paginate(request, candidates, ordering=ORDERING)
+    return [candidate.post for candidate in candidates], next_cursor
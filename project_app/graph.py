@@ -0,0 +1,335 @@
+# File: graph.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the in-memory follow graph: each process keeps the Follow table as compact
+# sorted arrays (compressed sparse rows), so "who follows whom" questions are answered without a query
+
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections, transaction
+
+from .models import Follow
+
+logger = logging.getLogger(__name__)
+
+# the shared version of the follow graph, bumped on every committed follow and unfollow, and the change log: the
+# change that made version n is kept under CHANGE_KEY.format(n) for CHANGE_TTL seconds, so the other processes
+# apply it to their graphs instead of rebuilding them. both are kept in a cache every process can see (an
+# in-memory cache would leave each process its own version)
+VERSION_KEY = 'follow_graph:version'
+CHANGE_KEY = 'follow_graph:change:{}'
+CACHE_ALIAS = getattr(settings, 'FOLLOW_GRAPH_CACHE', 'default')
+CHANGE_TTL = getattr(settings, 'FOLLOW_GRAPH_CHANGE_TTL', 600)
+# a graph further behind than this many changes, or missing one of them from the log (follows written without
+# signals, an evicted entry), is lagging: questions go to the database while it is rebuilt in the background, at
+# most once every REBUILD_INTERVAL seconds. a graph older than MAX_AGE is rebuilt too (while still being used),
+# in case it missed changes it could not see (two processes bumping the version at once with a cache that
+# can't increment atomically)
+CATCH_UP_LIMIT = 1000
+REBUILD_INTERVAL = getattr(settings, 'FOLLOW_GRAPH_REBUILD_INTERVAL', 5)
+MAX_AGE = getattr(settings, 'FOLLOW_GRAPH_MAX_AGE', 300)
+# how many follows and unfollows are kept on the side before the arrays are rebuilt (in memory) to include them
+COMPACT_AFTER = 10000
+
+BATCH_SIZE = 10000
+
+
+def compressed_rows(pairs, size):
+    '''packs (row, column) node pairs into compressed sparse rows: the columns of row n are
+    columns[offsets[n]:offsets[n + 1]], in ascending order'''
+    pairs = sorted(pairs)
+    offsets = array('q', [0] * (size + 1))
+    for row, _ in pairs:
+        offsets[row + 1] += 1
+    for row in range(size):
+        offsets[row + 1] += offsets[row]
+    columns = array('q', (column for _, column in pairs))
+    return offsets, columns
+
+
+class FollowGraph:
+    '''a snapshot of the follow graph in both directions (who each user follows, and who follows them),
+    plus the follows and unfollows made since the snapshot was packed; the module's graph is only read
+    and changed with the lock held (apply() can swap the arrays)'''
+
+    def __init__(self, edges, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        # users are numbered so the arrays can hold small integers instead of uuids
+        self.nodes = {}
+        self.users = []
+        self.pack([(self.node(follower), self.node(following)) for follower, following in edges])
+
+    def node(self, user_id):
+        '''the number of a user in the arrays, numbering new users as they are seen'''
+        number = self.nodes.get(user_id)
+        if number is None:
+            number = self.nodes[user_id] = len(self.users)
+            self.users.append(user_id)
+        return number
+
+    def pack(self, pairs):
+        '''builds the arrays from (follower, following) node pairs, emptying the pending changes'''
+        self.following_offsets, self.following_columns = compressed_rows(pairs, len(self.users))
+        self.follower_offsets, self.follower_columns = compressed_rows([(b, a) for a, b in pairs], len(self.users))
+        self.added = defaultdict(set)
+        self.removed = defaultdict(set)
+        self.added_followers = defaultdict(set)
+        self.removed_followers = defaultdict(set)
+        self.pending = 0
+
+    def packed(self, offsets, node):
+        '''the (start, end) of a node's row in the packed arrays (users added since packing have none)'''
+        if node + 1 >= len(offsets):
+            return 0, 0
+        return offsets[node], offsets[node + 1]
+
+    def follows_node(self, follower, following):
+        '''whether one node follows another'''
+        if following in self.removed.get(follower, ()):
+            return False
+        if following in self.added.get(follower, ()):
+            return True
+        start, end = self.packed(self.following_offsets, follower)
+        position = bisect_left(self.following_columns, following, start, end)
+        return position < end and self.following_columns[position] == following
+
+    def row(self, node, followers=False):
+        '''the set of nodes a node follows (or, with followers=True, is followed by)'''
+        if followers:
+            offsets, columns, added, removed = self.follower_offsets, self.follower_columns, self.added_followers, self.removed_followers
+        else:
+            offsets, columns, added, removed = self.following_offsets, self.following_columns, self.added, self.removed
+        start, end = self.packed(offsets, node)
+        nodes = set(columns[start:end])
+        nodes |= added.get(node, set())
+        nodes -= removed.get(node, set())
+        return nodes
+
+    def apply(self, follower_id, following_id, followed):
+        '''records a follow (followed=True) or unfollow made since the arrays were packed'''
+        follower, following = self.node(follower_id), self.node(following_id)
+        if followed:
+            self.removed[follower].discard(following)
+            self.removed_followers[following].discard(follower)
+            self.added[follower].add(following)
+            self.added_followers[following].add(follower)
+        else:
+            self.added[follower].discard(following)
+            self.added_followers[following].discard(follower)
+            self.removed[follower].add(following)
+            self.removed_followers[following].add(follower)
+        self.pending += 1
+        if self.pending >= COMPACT_AFTER:
+            self.pack([(a, b) for a in range(len(self.users)) for b in self.row(a)])
+
+    def users_for(self, nodes):
+        '''maps node numbers back to user ids'''
+        return {self.users[node] for node in nodes}
+
+    # the questions the graph answers, by user id
+
+    def is_following(self, follower_id, following_id):
+        follower, following = self.nodes.get(follower_id), self.nodes.get(following_id)
+        return follower is not None and following is not None and self.follows_node(follower, following)
+
+    def followed_among(self, user_id, candidate_ids):
+        '''which of the candidates the user follows (e.g. the authors on a page)'''
+        user = self.nodes.get(user_id)
+        if user is None:
+            return set()
+        return {candidate for candidate in candidate_ids if candidate in self.nodes and self.follows_node(user, self.nodes[candidate])}
+
+    def following(self, user_id):
+        user = self.nodes.get(user_id)
+        return self.users_for(self.row(user)) if user is not None else set()
+
+    def followers(self, user_id):
+        user = self.nodes.get(user_id)
+        return self.users_for(self.row(user, followers=True)) if user is not None else set()
+
+    def mutual_follows(self, user_id):
+        '''the users who follow the user and are followed back'''
+        user = self.nodes.get(user_id)
+        return self.users_for(self.row(user) & self.row(user, followers=True)) if user is not None else set()
+
+    def followed_by_following(self, user_id, other_id):
+        '''the users the user follows who also follow the other user ("followed by people you follow")'''
+        user, other = self.nodes.get(user_id), self.nodes.get(other_id)
+        if user is None or other is None:
+            return set()
+        return self.users_for(self.row(user) & self.row(other, followers=True))
+
+
+# this process's graph, when it was last (re)built (or a rebuild was started), and whether a rebuild is running;
+# the lock is held while the graph is read or changed, so a question never sees a change half applied
+graph = None
+last_build = float('-inf')
+building = False
+lock = threading.RLock()
+# returned by ask() when this process's graph can't answer
+LAGGING = object()
+
+
+def shared_version():
+    '''the current version of the follow graph, shared by every process through the cache'''
+    cache = caches[CACHE_ALIAS]
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        start_version()
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def start_version():
+    '''(re)starts a missing version from the clock in milliseconds rather than 0, so it doesn't count through
+    the numbers of changes still in the log from before it went missing'''
+    caches[CACHE_ALIAS].add(VERSION_KEY, int(time.time() * 1000), None)
+
+
+def build():
+    '''loads the whole Follow table into a new graph (the version is read first, so changes made
+    while loading are applied from the change log afterwards rather than silently missed)'''
+    global graph, last_build
+    version = shared_version()
+    edges = Follow.objects.values_list('follower', 'following').iterator(chunk_size=BATCH_SIZE)
+    new_graph = FollowGraph(edges, version)
+    with lock:
+        graph = new_graph
+        last_build = time.monotonic()
+    return new_graph
+
+
+def build_in_background():
+    '''starts rebuilding the graph in a thread of its own, unless a rebuild is already running'''
+    global building, last_build
+    with lock:
+        if building:
+            return
+        building = True
+        # a failed rebuild isn't retried until REBUILD_INTERVAL has passed either
+        last_build = time.monotonic()
+    threading.Thread(target=background_build, name='follow-graph-build', daemon=True).start()
+
+
+def background_build():
+    global building
+    try:
+        build()
+    except DatabaseError:
+        logger.exception('rebuilding the follow graph failed')
+    finally:
+        building = False
+        # the thread's own database connections
+        connections.close_all()
+
+
+def catch_up(current_graph, version):
+    '''applies the changes from the graph's version up to the given one from the change log, returning
+    whether they were all there'''
+    if not 0 < version - current_graph.version <= CATCH_UP_LIMIT:
+        return False
+    keys = [CHANGE_KEY.format(number) for number in range(current_graph.version + 1, version + 1)]
+    changes = caches[CACHE_ALIAS].get_many(keys)
+    if len(changes) < len(keys):
+        return False
+    for key in keys:
+        current_graph.apply(*changes[key])
+    current_graph.version = version
+    return True
+
+
+def current(version):
+    '''this process's graph brought up to the shared version, else None (callers then ask the database); a
+    lagging or missing graph is rebuilt in the background, at most once every REBUILD_INTERVAL seconds, so no
+    request waits for the Follow table to be loaded; called with the lock held'''
+    rebuild_due = time.monotonic() - last_build >= REBUILD_INTERVAL
+    if graph is not None and (graph.version == version or catch_up(graph, version)):
+        if rebuild_due and time.monotonic() - graph.built_at >= MAX_AGE:
+            build_in_background()
+        return graph
+    if rebuild_due:
+        build_in_background()
+    return None
+
+
+def ask(question, *args):
+    '''answers a question (the name of a FollowGraph method) from this process's graph, or returns LAGGING'''
+    # (the shared cache is read before the lock is taken, so threads don't wait on each other's reads)
+    version = shared_version()
+    with lock:
+        current_graph = current(version)
+        if current_graph is None:
+            return LAGGING
+        return getattr(current_graph, question)(*args)
+
+
+def bump_version():
+    '''bumps the shared version, returning the new one; called directly after follows are written without
+    signals (e.g. with bulk_create by the seed command), which leaves every graph lagging, since the new
+    version has no change in the log'''
+    cache = caches[CACHE_ALIAS]
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # the version was evicted from the cache (every graph will be seen as lagging and rebuilt)
+        start_version()
+        return cache.incr(VERSION_KEY)
+
+
+def edge_changed(follower_id, following_id, followed):
+    '''records a follow or unfollow for every process's graph once the transaction writing it commits
+    (a rolled back follow changes nothing)'''
+    transaction.on_commit(lambda: log_edge(follower_id, following_id, followed))
+
+
+def log_edge(follower_id, following_id, followed):
+    '''adds a committed follow or unfollow to the change log under a new version; every graph, this
+    process's too, applies it from there the next time it is asked, so all of them apply the changes in
+    the same order'''
+    version = bump_version()
+    caches[CACHE_ALIAS].set(CHANGE_KEY.format(version), (follower_id, following_id, followed), CHANGE_TTL)
+
+
+def warm():
+    '''builds the graph ahead of the first request (called when the web server starts)'''
+    if graph is None:
+        build()
+
+
+# each question with its database fallback, for when the graph is lagging
+
+def is_following(follower_id, following_id):
+    answer = ask('is_following', follower_id, following_id)
+    if answer is not LAGGING:
+        return answer
+    return Follow.objects.filter(follower=follower_id, following=following_id).exists()
+
+
+def followed_among(user_id, candidate_ids):
+    answer = ask('followed_among', user_id, candidate_ids)
+    if answer is not LAGGING:
+        return answer
+    return set(Follow.objects.filter(follower=user_id, following__in=list(candidate_ids)).values_list('following', flat=True))
+
+
+def mutual_follows(user_id):
+    answer = ask('mutual_follows', user_id)
+    if answer is not LAGGING:
+        return answer
+    followers = Follow.objects.filter(following=user_id).values('follower')
+    return set(Follow.objects.filter(follower=user_id, following__in=followers).values_list('following', flat=True))
+
+
+def followed_by_following(user_id, other_id):
+    answer = ask('followed_by_following', user_id, other_id)
+    if answer is not LAGGING:
+        return answer
+    following = Follow.objects.filter(follower=user_id).values('following')
+    return set(Follow.objects.filter(following=other_id, follower__in=following).values_list('follower', flat=True))
@@ -0,0 +1,134 @@
+# File: images.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the image derivative pipeline: uploads are resized to a few fixed
+# widths in webp and jpeg, and clients are sent the urls of the sizes in the best format they accept
+
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+# the derivative widths, in pixels (images are never scaled up)
+SIZES = {
+    'thumbnail': 320,
+    'feed': 640,
+    'full': 1280,
+}
+# the formats each size is stored in: extension -> (pillow format, save options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DEFAULT_FORMAT = 'jpeg'
+
+
+def preferred_format(request):
+    '''picks webp when the client's Accept header allows it, and jpeg otherwise'''
+    if request is not None and 'image/webp' in request.META.get('HTTP_ACCEPT', ''):
+        return 'webp'
+    return DEFAULT_FORMAT
+
+
+def derivative_name(name, size, extension):
+    '''the storage name of one derivative of an image, e.g. uploads/posts/derived/hat_feed.webp'''
+    folder, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(folder, 'derived', f'{stem}_{size}.{extension}')
+
+
+def encode(image, extension):
+    '''encodes a pillow image in one of the derivative formats'''
+    pillow_format, options = FORMATS[extension]
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        # jpeg has no transparency, so flatten the image onto white
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_derivatives(fieldfile):
+    '''writes every size and format of an uploaded image to storage, returning the variants map
+    {'source': name, 'sizes': {size: {extension: name}}} that is stored on the model'''
+    storage = fieldfile.storage
+    with storage.open(fieldfile.name, 'rb') as source:
+        original = Image.open(source)
+        # phone photos are often stored sideways with an orientation tag
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if 'A' in original.getbands() or original.mode == 'P' else 'RGB')
+        original.load()
+
+    sizes = {}
+    for size, width in SIZES.items():
+        resized = original
+        if original.width > width:
+            height = round(original.height * width / original.width)
+            resized = original.resize((width, height), Image.LANCZOS)
+        sizes[size] = {}
+        for extension in FORMATS:
+            name = derivative_name(fieldfile.name, size, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            sizes[size][extension] = storage.save(name, encode(resized, extension))
+    return {'source': fieldfile.name, 'sizes': sizes}
+
+
+def derivative_names(variants):
+    '''the storage names of the derivative files listed in a variants map'''
+    return [name for names in (variants or {}).get('sizes', {}).values() for name in names.values()]
+
+
+def delete_derivatives(storage, variants):
+    '''removes the derivative files listed in a variants map from storage'''
+    for name in derivative_names(variants):
+        storage.delete(name)
+
+
+def refresh_derivatives(instance, field, variants_field):
+    '''regenerates the derivatives of a model's image if it has changed since they were made, saving the
+    new variants map on the instance; returns whether anything was generated'''
+    fieldfile = getattr(instance, field)
+    old_variants = getattr(instance, variants_field)
+    if not needs_derivatives(fieldfile, old_variants):
+        return False
+    try:
+        variants = generate_derivatives(fieldfile)
+    except OSError:
+        # the file is missing or isn't an image pillow can read, so the original keeps being served
+        return False
+    # the old derivatives belong to an image that is no longer used
+    delete_derivatives(fieldfile.storage, old_variants)
+    setattr(instance, variants_field, variants)
+    type(instance).objects.filter(pk=instance.pk).update(**{variants_field: variants, 'updated_at': timezone.now()})
+    # an update() sends no signals, so the cached responses with the old image urls are invalidated here
+    # (imported here because models.py imports this module)
+    from . import response_cache
+    response_cache.invalidate(*response_cache.tags_for(instance))
+    return True
+
+
+def needs_derivatives(fieldfile, variants):
+    '''true when an image is set but its derivatives were made from a different (or no) upload'''
+    return bool(fieldfile) and (variants or {}).get('source') != fieldfile.name
+
+
+def size_urls(fieldfile, variants, image_format=DEFAULT_FORMAT):
+    '''the map {size: url} of an image's derivatives in the given format (every size falls back to the
+    original upload until its derivatives have been generated)'''
+    if not fieldfile:
+        return {}
+    original = f'{settings.WEBSITE_URL}{fieldfile.url}'
+    variants = variants or {}
+    if variants.get('source') != fieldfile.name:
+        return {size: original for size in SIZES}
+    storage = fieldfile.storage
+    return {
+        size: f"{settings.WEBSITE_URL}{storage.url(names[image_format])}" if image_format in names else original
+        for size, names in variants.get('sizes', {}).items()
+    }
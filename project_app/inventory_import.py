@@ -0,0 +1,141 @@
+# File: inventory_import.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the bulk inventory import: rows are read from a CSV or JSON lines upload a
+# line at a time, validated in chunks, and written with bulk_create, with errors reported per row
+
+import csv
+import json
+import uuid
+
+from django.db import transaction
+from rest_framework import serializers
+
+from . import response_cache, signals
+from .models import InventoryItem
+from .serializers import InventoryImportRowSerializer
+
+# rows are validated and written this many at a time
+CHUNK_SIZE = 500
+# the most rows one import may contain
+MAX_ROWS = 10000
+# the most ids one bulk delete may contain
+MAX_DELETE = 1000
+
+
+class InvalidImport(ValueError):
+    '''raised when an upload can't be read at all (as opposed to a single bad row)'''
+
+
+def text_lines(lines):
+    '''decodes an iterable of byte lines (a request body or an uploaded file) as utf-8, one line at a time'''
+    for line in lines:
+        yield line.decode('utf-8-sig') if isinstance(line, bytes) else line
+
+
+def read_rows(lines, file_format):
+    '''yields (line number, row dict) from a CSV file with a header row, or from JSON lines'''
+    if file_format == 'csv':
+        reader = csv.DictReader(text_lines(lines))
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(text_lines(lines), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else {'__invalid__': line}
+
+
+def checked_images(images):
+    '''validates each uploaded image once, mapping the name of a file that isn't an image to its error'''
+    checked = {}
+    for name, upload in images.items():
+        try:
+            checked[name] = serializers.ImageField().to_internal_value(upload)
+        except serializers.ValidationError as error:
+            checked[name] = error
+    return checked
+
+
+def build_items(chunk, user, images):
+    '''validates a chunk of (line number, row) pairs, returning the unsaved items and the errors by line'''
+    items = []
+    errors = []
+    for line, row in chunk:
+        if '__invalid__' in row:
+            errors.append({'line': line, 'errors': {'row': ['not a JSON object']}})
+            continue
+        serializer = InventoryImportRowSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append({'line': line, 'errors': serializer.errors})
+            continue
+        data = serializer.validated_data
+        image_name = data.pop('image', '')
+        if image_name and image_name not in images:
+            errors.append({'line': line, 'errors': {'image': [f'no file named {image_name} was uploaded']}})
+            continue
+        if image_name and isinstance(images[image_name], Exception):
+            errors.append({'line': line, 'errors': {'image': images[image_name].detail}})
+            continue
+        items.append(InventoryItem(user=user, image=images.get(image_name) or '', **data))
+    return items, errors
+
+
+def import_items(user, lines, file_format, images=None):
+    '''imports inventory items for a user from CSV or JSON lines, returning (number created, errors by line);
+    the valid rows are all written in one transaction'''
+    if file_format not in ('csv', 'jsonl'):
+        raise InvalidImport(f'unsupported format {file_format}')
+    images = checked_images(images or {})
+    created = []
+    errors = []
+    chunk = []
+    with transaction.atomic():
+        for count, (line, row) in enumerate(read_rows(lines, file_format), start=1):
+            if count > MAX_ROWS:
+                raise InvalidImport(f'an import can have at most {MAX_ROWS} rows')
+            chunk.append((line, row))
+            if len(chunk) == CHUNK_SIZE:
+                created += write_chunk(chunk, user, images, errors)
+                chunk = []
+        created += write_chunk(chunk, user, images, errors)
+
+        # bulk_create sends no signals, so do what the save signals would have done
+        for item in created:
+            signals.enqueue_derivatives(item, 'image', 'image_variants')
+        if created:
+            response_cache.invalidate(f'user:{user.pk}')
+    return len(created), errors
+
+
+def write_chunk(chunk, user, images, errors):
+    '''validates and inserts one chunk of rows, adding its errors to errors and returning the created items'''
+    if not chunk:
+        return []
+    items, chunk_errors = build_items(chunk, user, images)
+    errors += chunk_errors
+    return InventoryItem.objects.bulk_create(items)
+
+
+def delete_items(user, item_ids):
+    '''deletes the user's items with the given ids, returning (the ids deleted, the ids not found, as they were
+    sent); ids are compared as uuids, so any spelling of one (upper case, without hyphens) matches'''
+    if len(item_ids) > MAX_DELETE:
+        raise InvalidImport(f'a bulk delete can have at most {MAX_DELETE} ids')
+    parsed, invalid = {}, []
+    for item_id in item_ids:
+        try:
+            parsed[item_id] = uuid.UUID(str(item_id))
+        except ValueError:
+            invalid.append(str(item_id))
+    if invalid:
+        raise InvalidImport(f'invalid ids: {", ".join(invalid)}')
+    items = InventoryItem.objects.filter(user=user, id__in=set(parsed.values()))
+    with transaction.atomic():
+        found = set(items.values_list('id', flat=True))
+        # a queryset delete still sends each item's delete signal (releasing its image, etc.)
+        items.delete()
+    return sorted(map(str, found)), sorted({str(item_id) for item_id, value in parsed.items() if value not in found})
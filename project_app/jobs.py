@@ -0,0 +1,151 @@
+# File: jobs.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the background job queue: jobs are rows in the database (so no
+# outside broker is needed), views enqueue them and the run_jobs worker command runs them
+
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# how long a claimed job stays invisible to other workers before it is assumed lost and retried
+VISIBILITY_TIMEOUT = timedelta(seconds=getattr(settings, 'JOBS_VISIBILITY_TIMEOUT', 300))
+# retries wait BACKOFF_BASE * 2^(attempt - 1), up to BACKOFF_MAX
+BACKOFF_BASE = timedelta(seconds=getattr(settings, 'JOBS_BACKOFF_BASE', 5))
+BACKOFF_MAX = timedelta(seconds=getattr(settings, 'JOBS_BACKOFF_MAX', 3600))
+# how many ready jobs a worker looks at each time it tries to claim one
+CLAIM_BATCH = 10
+
+# the registered task functions, by name
+TASKS = {}
+
+
+def task(name):
+    '''registers a function as a task that jobs can run; its arguments come from the job's payload'''
+    def register(function):
+        TASKS[name] = function
+        return function
+    return register
+
+
+def enqueue(task_name, payload=None, priority=0, key=None, delay=None, max_attempts=5):
+    '''adds a job to the queue and returns it; if a job with the same idempotency key already exists,
+    that job is returned instead of adding another one'''
+    if task_name not in TASKS:
+        raise ValueError(f'unknown task {task_name}')
+    job = Job(
+        task=task_name,
+        payload=payload or {},
+        priority=priority,
+        idempotency_key=key,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + (delay or timedelta(0)),
+    )
+    if key is None:
+        job.save()
+    else:
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            return Job.objects.get(idempotency_key=key)
+    # settings.JOBS_RUN_EAGERLY runs jobs as soon as they are committed, without a worker (for local development)
+    if getattr(settings, 'JOBS_RUN_EAGERLY', False):
+        transaction.on_commit(lambda: run_eagerly(job.id))
+    return job
+
+
+def run_eagerly(job_id):
+    '''runs a just enqueued job straight away'''
+    job = claim_job(job_id)
+    if job is not None:
+        run_job(job)
+
+
+def ready_jobs(now):
+    '''the jobs a worker may claim: queued jobs that are due, and running jobs whose worker timed out
+    (unless they have used all of their attempts)'''
+    return Job.objects.filter(
+        Q(status='queued', run_after__lte=now) | Q(status='running', locked_until__lt=now, attempts__lt=F('max_attempts'))
+    )
+
+
+def fail_timed_out(now):
+    '''gives up on the running jobs whose worker timed out on their last attempt'''
+    return Job.objects.filter(status='running', locked_until__lt=now, attempts__gte=F('max_attempts')).update(
+        status='failed', last_error='timed out on the last attempt', locked_until=None, finished_at=now,
+    )
+
+
+def claim_job(job_id=None):
+    '''claims one ready job (or the given job, if it is ready) for this worker, returning it or None
+
+    the claim is a conditional UPDATE, so when two workers race for the same job only one of them
+    changes the row; this works the same on sqlite and postgresql'''
+    now = timezone.now()
+    candidates = ready_jobs(now)
+    if job_id is not None:
+        candidates = candidates.filter(id=job_id)
+    for candidate_id in candidates.order_by('-priority', 'run_after').values_list('id', flat=True)[:CLAIM_BATCH]:
+        claimed = ready_jobs(now).filter(id=candidate_id).update(
+            status='running',
+            attempts=F('attempts') + 1,
+            locked_until=now + VISIBILITY_TIMEOUT,
+        )
+        if claimed:
+            return Job.objects.get(id=candidate_id)
+    return None
+
+
+def backoff(attempts):
+    '''how long to wait before retrying a job that has failed the given number of times'''
+    return min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+
+
+def finish(job, **changes):
+    '''records the outcome of a job, but only if this worker still holds its claim (after the visibility
+    timeout another worker may have claimed it again, and its outcome is the one that counts)'''
+    held = Job.objects.filter(id=job.id, status='running', attempts=job.attempts, locked_until=job.locked_until)
+    if not held.update(locked_until=None, **changes):
+        logger.warning('job %s (%s) timed out on attempt %s, so its outcome was dropped', job.id, job.task, job.attempts)
+
+
+def run_job(job):
+    '''runs a claimed job, then marks it done, or schedules a retry (or gives up) if it raised'''
+    try:
+        TASKS[job.task](**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('job %s (%s) failed on attempt %s:\n%s', job.id, job.task, job.attempts, error)
+        if job.attempts >= job.max_attempts:
+            finish(job, status='failed', last_error=error, finished_at=timezone.now())
+        else:
+            finish(job, status='queued', last_error=error, run_after=timezone.now() + backoff(job.attempts))
+        return False
+    finish(job, status='done', finished_at=timezone.now())
+    return True
+
+
+def run_next():
+    '''claims and runs the next ready job; returns False when there was nothing to run'''
+    job = claim_job()
+    if job is None:
+        # (only when idle, so the busy path doesn't pay for it)
+        fail_timed_out(timezone.now())
+        return False
+    run_job(job)
+    return True
+
+
+def purge_finished(older_than):
+    '''deletes the jobs that finished successfully more than the given timedelta ago'''
+    deleted, _ = Job.objects.filter(status='done', finished_at__lt=timezone.now() - older_than).delete()
+    return deleted
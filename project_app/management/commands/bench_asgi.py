@@ -0,0 +1,128 @@
+# File: bench_asgi.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that compares a read endpoint served by one synchronous WSGI worker with
+# its async version served by the ASGI server (uvicorn), under concurrent clients and a simulated slow database
+
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from project_app.models import Post, User
+
+
+class QuietHandler(WSGIRequestHandler):
+    '''a request handler that doesn't log every request'''
+
+    def log_message(self, format, *args):
+        pass
+
+
+def add_latency(seconds):
+    '''makes every query on new database connections take (at least) seconds longer, like a remote database'''
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def connected(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+    # weak=False, since the receiver is a closure nothing else keeps alive
+    connection_created.connect(connected, weak=False)
+    return connected
+
+
+def seed(posts):
+    '''fills the (empty) benchmark database with posts by a few users'''
+    users = User.objects.bulk_create([User(email=f'bench{i}@example.com', username=f'bench{i}', name=f'Bench {i}') for i in range(20)])
+    Post.objects.bulk_create([Post(user=users[i % len(users)], caption=f'post {i}') for i in range(posts)])
+
+
+def load(url, requests, concurrency):
+    '''sends requests GETs to url from concurrency clients at once, returning (seconds taken, latencies, errors)'''
+    def fetch(_):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                response.read()
+        except (urllib.error.URLError, OSError):
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(fetch, range(requests)))
+    latencies = [result for result in results if result is not None]
+    return time.perf_counter() - start, latencies, len(results) - len(latencies)
+
+
+class Command(BaseCommand):
+    help = 'Compares throughput of a sync WSGI worker and the async ASGI views under concurrent load and database latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='how many requests are sent to each server')
+        parser.add_argument('--concurrency', type=int, default=20, help='how many clients send requests at once')
+        parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every query')
+        parser.add_argument('--posts', type=int, default=200, help='how many posts the benchmark database holds')
+        parser.add_argument('--wsgi-path', default='/api/posts', help='the sync endpoint')
+        parser.add_argument('--asgi-path', default='/api/async/posts', help='the async endpoint')
+
+    def handle(self, *args, **options):
+        '''serves each app on a local port from a throwaway database, loads it, and prints a table of the results'''
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError('uvicorn is not installed')
+        # a test database (in memory for sqlite), so the benchmark neither needs nor touches real data
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seed(options['posts'])
+            self.run_servers(uvicorn, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_servers(self, uvicorn, options):
+        '''starts both servers and loads each in turn'''
+        receiver = add_latency(options['latency'])
+
+        # one single threaded WSGI server: what one sync gunicorn worker can do
+        wsgi_server = make_server('127.0.0.1', 0, get_wsgi_application(), handler_class=QuietHandler)
+        threading.Thread(target=wsgi_server.serve_forever, daemon=True).start()
+
+        # one uvicorn process (event loop) serving the ASGI app
+        asgi_server = uvicorn.Server(uvicorn.Config(get_asgi_application(), host='127.0.0.1', port=0, log_level='warning', lifespan='off'))
+        threading.Thread(target=asgi_server.run, daemon=True).start()
+        while not asgi_server.started:
+            time.sleep(0.05)
+        asgi_port = asgi_server.servers[0].sockets[0].getsockname()[1]
+
+        targets = [
+            ('wsgi (1 sync worker)', f'http://127.0.0.1:{wsgi_server.server_port}{options["wsgi_path"]}'),
+            ('asgi (1 uvicorn worker)', f'http://127.0.0.1:{asgi_port}{options["asgi_path"]}'),
+        ]
+        self.stdout.write(
+            f'{options["requests"]} requests, {options["concurrency"]} at a time, {options["latency"] * 1000:.0f}ms per query\n'
+            f'{"server":<26}{"req/s":>8}{"p50 ms":>9}{"p95 ms":>9}{"errors":>8}'
+        )
+        try:
+            for name, url in targets:
+                seconds, latencies, errors = load(url, options['requests'], options['concurrency'])
+                if len(latencies) < 2:
+                    self.stdout.write(f'{name:<26}{"failed":>8}')
+                    continue
+                cuts = statistics.quantiles(latencies, n=20)
+                self.stdout.write(
+                    f'{name:<26}{len(latencies) / seconds:>8.1f}{statistics.median(latencies) * 1000:>9.1f}{cuts[18] * 1000:>9.1f}{errors:>8}'
+                )
+        finally:
+            wsgi_server.shutdown()
+            asgi_server.should_exit = True
+            connection_created.disconnect(receiver)
@@ -0,0 +1,121 @@
+# File: bench_db.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that runs a mixed read/write load against two scratch SQLite files, one with
+# SQLite's defaults and one with the tuned settings from project/database.py, and compares their throughput
+
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+
+from project.database import sqlite_config
+from project_app.models import Pattern, Post, User
+
+
+def add_database(alias, config):
+    '''registers a database alias at run time (with the defaults django fills in for configured ones)'''
+    connections.settings[alias] = connections.configure_settings({'default': config})['default']
+
+
+def create_tables(alias, users):
+    '''creates the tables the load touches, returning the ids of the users it writes as'''
+    with connections[alias].schema_editor() as editor:
+        for model in (User, Pattern, Post):
+            editor.create_model(model)
+    created = User.objects.using(alias).bulk_create(
+        [User(email=f'bench{i}@example.com', username=f'bench{i}', name=f'Bench {i}') for i in range(users)]
+    )
+    return [user.id for user in created]
+
+
+def read(alias):
+    '''a feed page: the newest posts with their authors'''
+    list(Post.objects.using(alias).select_related('user').order_by('-created_at', '-id')[:20])
+
+
+def write(alias, user_id):
+    '''what creating a post does: check the author, insert the post and bump a counter, in one transaction'''
+    with transaction.atomic(using=alias):
+        User.objects.using(alias).filter(id=user_id).exists()
+        Post.objects.using(alias).bulk_create([Post(user_id=user_id, caption='bench')])
+        User.objects.using(alias).filter(id=user_id).update(follower_count=F('follower_count') + 1)
+
+
+def run_load(alias, user_ids, threads, seconds, write_ratio):
+    '''runs the load from several threads for a number of seconds, returning (reads, writes, errors, write latencies)'''
+    results = {'reads': 0, 'writes': 0, 'errors': 0, 'write_latencies': []}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker():
+        reads = writes = errors = 0
+        latencies = []
+        while time.monotonic() < deadline:
+            try:
+                if random.random() < write_ratio:
+                    start = time.perf_counter()
+                    write(alias, random.choice(user_ids))
+                    latencies.append(time.perf_counter() - start)
+                    writes += 1
+                else:
+                    read(alias)
+                    reads += 1
+            except OperationalError:
+                # "database is locked"
+                errors += 1
+        connections[alias].close()
+        with lock:
+            results['reads'] += reads
+            results['writes'] += writes
+            results['errors'] += errors
+            results['write_latencies'] += latencies
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results
+
+
+class Command(BaseCommand):
+    help = 'Compares mixed read/write throughput of SQLite with its defaults and with the tuned settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='how many threads run the load at once')
+        parser.add_argument('--seconds', type=float, default=5, help='how long each database is loaded for')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='the share of operations that are writes')
+
+    def handle(self, *args, **options):
+        '''loads each scratch database in turn and prints a table of the results'''
+        with tempfile.TemporaryDirectory() as directory:
+            profiles = [
+                ('sqlite defaults', {'ENGINE': 'django.db.backends.sqlite3', 'NAME': Path(directory) / 'defaults.sqlite3'}),
+                ('sqlite tuned', sqlite_config(Path(directory) / 'tuned.sqlite3')),
+            ]
+            self.stdout.write(
+                f'{options["threads"]} threads, {options["seconds"]:g}s each, {options["write_ratio"]:.0%} writes\n'
+                f'{"database":<18}{"ops/s":>9}{"reads/s":>9}{"writes/s":>10}{"locked":>8}{"p95 write ms":>14}'
+            )
+            for name, config in profiles:
+                alias = 'bench_' + name.split()[-1]
+                add_database(alias, config)
+                try:
+                    user_ids = create_tables(alias, options['threads'] * 4)
+                    results = run_load(alias, user_ids, options['threads'], options['seconds'], options['write_ratio'])
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+                latencies = results['write_latencies']
+                p95 = statistics.quantiles(latencies, n=20)[18] * 1000 if len(latencies) > 1 else 0
+                seconds = options['seconds']
+                self.stdout.write(
+                    f'{name:<18}{(results["reads"] + results["writes"]) / seconds:>9.0f}{results["reads"] / seconds:>9.0f}'
+                    f'{results["writes"] / seconds:>10.0f}{results["errors"]:>8}{p95:>14.1f}'
+                )
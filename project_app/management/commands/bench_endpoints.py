@@ -0,0 +1,222 @@
+# File: bench_endpoints.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that sends requests to every named url in project_app/urls.py (through the
+# test client, as a seeded user) and reports latency percentiles, queries and response size for each, optionally
+# saving the results as a baseline or comparing them with one
+
+import io
+import json
+import statistics
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from project_app.management.commands.seed import SEED_DOMAIN, SEED_PASSWORD
+from project_app.models import Follow, InventoryItem, Pattern, User
+from project_app.urls import urlpatterns
+
+
+class RolledBack(Exception):
+    '''raised to roll back the changes of a benchmarked write'''
+
+
+def make_image():
+    '''a small png upload'''
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'white').save(buffer, format='PNG')
+    return SimpleUploadedFile('bench.png', buffer.getvalue(), content_type='image/png')
+
+
+def percentile(timings, n):
+    '''the n-th percentile of the timings (in milliseconds)'''
+    if len(timings) == 1:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method='inclusive')[n - 1]
+
+
+def response_size(response):
+    '''the number of body bytes of a (possibly streaming) response'''
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def bench_user():
+    '''the seeded user who follows the most accounts (the heaviest home feed), with an item and an account they don't follow'''
+    user = (
+        User.objects.filter(email__endswith='@' + SEED_DOMAIN, inventoryitem__isnull=False)
+        .order_by('-following_count', 'id').distinct().first()
+    )
+    if user is None:
+        raise CommandError('no seeded user with inventory found; run manage.py seed first')
+    return user
+
+
+def requests_for(user):
+    '''the request sent to each url name: (method, url, a function returning the data); the data is built for every
+    request, since uploads can only be read once'''
+    followed = Follow.objects.filter(follower=user).values('following')
+    stranger = User.objects.exclude(id=user.id).exclude(id__in=followed).order_by('-follower_count').first()
+    pattern = Pattern.objects.order_by('-save_count', '-created_at').first()
+    item = InventoryItem.objects.filter(user=user).first()
+    refresh = str(RefreshToken.for_user(user))
+    user_id = user.id
+    return {
+        'api_all_post_list': ('get', reverse('api_all_post_list'), None),
+        'api_create_post': ('post', reverse('api_create_post'), lambda: {'user': user_id, 'caption': 'benchmark post'}),
+        'api_exclude_user_posts': ('get', reverse('api_exclude_user_posts'), None),
+        'api_user_following_posts': ('get', reverse('api_user_following_posts'), None),
+        'api_user_explore_posts': ('get', reverse('api_user_explore_posts'), None),
+        'api_create_pattern': ('post', reverse('api_create_pattern', args=[user_id]), lambda: {
+            'creator': user_id, 'name': 'Bench Hat', 'description': 'a hat', 'difficulty': 'beginner', 'image': make_image(),
+        }),
+        'api_get_pattern': ('get', reverse('api_get_pattern'), None),
+        'api_pattern_info': ('get', reverse('api_pattern_info', args=[pattern.id]), None),
+        'api_user_following_patterns': ('get', reverse('api_user_following_patterns'), None),
+        'api_user_explore_patterns': ('get', reverse('api_user_explore_patterns'), None),
+        'api_exclude_user_patterns': ('get', reverse('api_exclude_user_patterns'), None),
+        'api_get_patterns_with_search': ('get', reverse('api_get_patterns_with_search'), lambda: {'search_query': pattern.name.split()[0]}),
+        'api_search_user': ('get', reverse('api_search_user'), lambda: {'search_query': stranger.username[:4]}),
+        'api_user_typeahead': ('get', reverse('api_user_typeahead'), lambda: {'search_query': stranger.username[1:5]}),
+        'api_user_suggestions': ('get', reverse('api_user_suggestions'), None),
+        'api_user_info': ('get', reverse('api_user_info', args=[user_id]), None),
+        'api_user_post_list': ('get', reverse('api_user_post_list', args=[user_id]), None),
+        'api_user_pattern_list': ('get', reverse('api_user_pattern_list', args=[pattern.creator_id]), None),
+        'update_user': ('put', reverse('update_user'), lambda: {'bio': 'benchmarking', 'link': 'https://example.com'}),
+        'follow_user': ('post', reverse('follow_user', args=[stranger.id]), None),
+        'user_following': ('get', reverse('user_following', args=[user_id]), None),
+        'user_followers': ('get', reverse('user_followers', args=[user_id]), None),
+        'async_all_post_list': ('get', reverse('async_all_post_list'), None),
+        'async_user_following_posts': ('get', reverse('async_user_following_posts'), None),
+        'async_user_explore_posts': ('get', reverse('async_user_explore_posts'), None),
+        'async_pattern_info': ('get', reverse('async_pattern_info', args=[pattern.id]), None),
+        'async_user_info': ('get', reverse('async_user_info', args=[user_id]), None),
+        'async_user_following': ('get', reverse('async_user_following', args=[user_id]), None),
+        'async_user_followers': ('get', reverse('async_user_followers', args=[user_id]), None),
+        'user_inventory': ('get', reverse('user_inventory', args=[user_id]), None),
+        'create_inventory_item': ('post', reverse('create_inventory_item', args=[user_id]), lambda: {'user': user_id, 'name': 'hook', 'item_type': 'hook_needle'}),
+        'delete_inventory_item': ('delete', reverse('delete_inventory_item', args=[item.id]), None),
+        'bulk_import_inventory': ('post', reverse('bulk_import_inventory'), lambda: {
+            'file': SimpleUploadedFile('items.csv', b'name,item_type,description\n' + b'merino yarn,yarn,dk weight\n' * 50),
+        }),
+        'bulk_delete_inventory': ('post', reverse('bulk_delete_inventory'), lambda: {'ids': [item.id]}),
+        'rest_register': ('post', reverse('rest_register'), lambda: {
+            'email': f'bench-register@{SEED_DOMAIN}', 'name': 'Bench', 'username': 'bench-register',
+            'password1': 'a-long-password-99', 'password2': 'a-long-password-99',
+        }),
+        'rest_login': ('post', reverse('rest_login'), lambda: {'email': user.email, 'password': SEED_PASSWORD}),
+        'rest_logout': ('post', reverse('rest_logout'), None),
+        'token_refresh': ('post', reverse('token_refresh'), lambda: {'refresh': refresh}),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Reports p50/p95/p99 latency, queries and bytes for every named url, against seeded data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=30, help='timed requests per url')
+        parser.add_argument('--warmup', type=int, default=2, help='untimed requests per url first')
+        parser.add_argument('--url', action='append', dest='urls', help='only benchmark this url name (repeatable)')
+        parser.add_argument('--cold', action='store_true', help='clear the cache before every request (no response cache hits)')
+        parser.add_argument('--save', metavar='FILE', help='save the results as a baseline (json)')
+        parser.add_argument('--baseline', metavar='FILE', help='compare the results with a saved baseline')
+
+    def handle(self, *args, **options):
+        '''sends the requests as the seeded user with the busiest feed; writes are rolled back, so the data is left as it was'''
+        user = bench_user()
+        requests = requests_for(user)
+        missing = {pattern.name for pattern in urlpatterns} - set(requests)
+        if missing:
+            raise CommandError(f'no benchmark request for: {", ".join(sorted(missing))}')
+        names = options['urls'] or list(requests)
+        baseline = self.load_baseline(options['baseline'])
+
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        results = {}
+        self.stdout.write(f'as {user.username} ({user.following_count} following), {options["requests"]} requests per url')
+        self.stdout.write(f'{"url":<30}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}{"bytes":>10}  status')
+        # the test client's host name, and a scratch media folder, since rolling back a write doesn't delete its uploads
+        with tempfile.TemporaryDirectory() as media_root, override_settings(ALLOWED_HOSTS=['testserver'], MEDIA_ROOT=media_root):
+            for name in names:
+                method, url, data = requests[name]
+                results[name] = self.bench(client, method, url, data, options)
+                self.report(name, results[name], baseline.get(name))
+
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Saved the baseline to {options["save"]}'))
+
+    def load_baseline(self, path):
+        if not path:
+            return {}
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f"can't read the baseline {path}: {error}")
+
+    def send(self, client, method, url, data):
+        '''sends one request, returning (response, body bytes, milliseconds, queries run)'''
+        send = getattr(client, method)
+        kwargs = {'content_type': 'application/json'} if method == 'put' else {}
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = send(url, data(), **kwargs) if data is not None else send(url, **kwargs)
+            size = response_size(response)
+            elapsed = (time.perf_counter() - start) * 1000
+        return response, size, elapsed, len(queries)
+
+    def bench(self, client, method, url, data, options):
+        '''times one url; a write runs in a transaction that is rolled back, so it can be repeated'''
+        timings, query_counts, sizes, statuses = [], [], [], {}
+        for number in range(options['warmup'] + options['requests']):
+            if options['cold']:
+                cache.clear()
+            if method == 'get':
+                response, size, elapsed, queries = self.send(client, method, url, data)
+            else:
+                # (the view's own transactions become savepoints, which are counted as queries)
+                try:
+                    with transaction.atomic():
+                        response, size, elapsed, queries = self.send(client, method, url, data)
+                        raise RolledBack
+                except RolledBack:
+                    pass
+            if number < options['warmup']:
+                continue
+            timings.append(elapsed)
+            query_counts.append(queries)
+            sizes.append(size)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return {
+            'p50': round(percentile(timings, 50), 3),
+            'p95': round(percentile(timings, 95), 3),
+            'p99': round(percentile(timings, 99), 3),
+            'queries': statistics.median(query_counts),
+            'bytes': round(statistics.median(sizes)),
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        }
+
+    def report(self, name, result, previous):
+        '''prints one url's results, with the change from the baseline when there is one'''
+        statuses = ','.join(result['statuses'])
+        self.stdout.write(
+            f'{name:<30}{result["p50"]:>9.1f}{result["p95"]:>9.1f}{result["p99"]:>9.1f}'
+            f'{result["queries"]:>9g}{result["bytes"]:>10}  {statuses}'
+        )
+        if previous:
+            change = lambda key: f'{(result[key] - previous[key]) / previous[key] * 100:+.0f}%' if previous[key] else 'n/a'
+            self.stdout.write(
+                f'{"  vs baseline":<30}{change("p50"):>9}{change("p95"):>9}{change("p99"):>9}'
+                f'{result["queries"] - previous["queries"]:>+9g}{result["bytes"] - previous["bytes"]:>+10}'
+            )
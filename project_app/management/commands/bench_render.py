@@ -0,0 +1,70 @@
+# File: bench_render.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that compares how long each response encoder takes to encode a feed of
+# posts, and how big the payload is (no database needed: the posts are built in memory)
+
+import gzip
+import json
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import RequestFactory
+from django.utils import timezone
+
+from project_app import renderers
+from project_app.models import Post, User
+from project_app.serializers import PostListSerializer
+
+
+def sample_feed(size):
+    '''the serialized data of a feed page of size posts by 50 authors, as the api would send it'''
+    authors = [User(id=uuid.uuid4(), name=f'Knitter {i}', username=f'knitter{i}', avatar=f'uploads/avatars/{i}.jpg') for i in range(50)]
+    now = timezone.now()
+    posts = [
+        Post(
+            id=uuid.uuid4(), user=authors[i % len(authors)], caption=f'my hat, take {i} (merino, 4mm needles)',
+            image=f'uploads/posts/{i}.jpg', created_at=now, like_count=i % 97, comment_count=i % 13, save_count=i % 7,
+        )
+        for i in range(size)
+    ]
+    request = RequestFactory().get('/api/posts/all')
+    return {'data': PostListSerializer(posts, many=True, context={'request': request}).data, 'next_cursor': None}
+
+
+def time_encoder(encode, data, repeat):
+    '''the median time (in milliseconds) to encode data, and the encoded payload'''
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = encode(data)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), payload
+
+
+class Command(BaseCommand):
+    help = 'Compares the encode time and payload size of the response encoders on a feed of posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000, help='how many posts are in the feed')
+        parser.add_argument('--repeat', type=int, default=20, help='how many times each encoder runs (the median is reported)')
+
+    def handle(self, *args, **options):
+        '''encodes the same feed with each encoder and prints a table of the results'''
+        data = sample_feed(options['posts'])
+        # JsonResponse's encoding, which the api used before renderers.py
+        encoders = {'json (stdlib)': lambda value: json.dumps(value, cls=DjangoJSONEncoder).encode()}
+        if renderers.orjson is not None:
+            encoders['orjson'] = renderers.dumps
+        if renderers.msgpack is not None:
+            encoders['msgpack'] = lambda value: renderers.msgpack.packb(value, default=renderers.fallback)
+
+        self.stdout.write(f'{"encoder":<16}{"ms":>10}{"bytes":>12}{"gzip bytes":>12}')
+        for name, encode in encoders.items():
+            milliseconds, payload = time_encoder(encode, data, options['repeat'])
+            self.stdout.write(f'{name:<16}{milliseconds:>10.2f}{len(payload):>12}{len(gzip.compress(payload)):>12}')
+        for name in ('orjson', 'msgpack'):
+            if name not in encoders:
+                self.stdout.write(f'{name} is not installed')
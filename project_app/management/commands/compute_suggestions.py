@@ -0,0 +1,19 @@
+# File: compute_suggestions.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that computes the "people you may know" suggestions (run it on a schedule)
+
+from django.core.management.base import BaseCommand
+
+from project_app import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the suggested accounts of the users whose follows (or whose follows\' follows) changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='recompute the suggestions of every user')
+
+    def handle(self, *args, **options):
+        '''recomputes the suggestions that may have changed since the last run'''
+        users, stored = suggestions.compute(everyone=options['all'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} suggestions for {users} users'))
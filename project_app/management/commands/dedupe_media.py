@@ -0,0 +1,43 @@
+# File: dedupe_media.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that moves the images uploaded before the content addressed storage
+# existed into it, so duplicate copies of the same image are replaced by one shared file
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from project_app.management.commands.generate_image_variants import IMAGE_MODELS
+
+
+class Command(BaseCommand):
+    help = 'Moves images stored under their upload names into the content addressed storage, merging duplicates'
+
+    def handle(self, *args, **options):
+        '''re-saves each image that isn't stored by hash yet, then deletes the old copies'''
+        if not hasattr(default_storage, 'is_blob'):
+            self.stderr.write('The default storage is not the content addressed storage')
+            return
+        old_names = set()
+        for model, field, _ in IMAGE_MODELS:
+            moved = 0
+            objects = model.objects.exclude(**{field: ''}).only('pk', field)
+            for instance in objects.iterator():
+                name = getattr(instance, field).name
+                if default_storage.is_blob(name):
+                    continue
+                if not default_storage.exists(name):
+                    self.stderr.write(f'{model.__name__} {instance.pk}: {name} is missing')
+                    continue
+                with default_storage.open(name, 'rb') as content:
+                    new_name = default_storage.save(name, content)
+                model.objects.filter(pk=instance.pk).update(**{field: new_name, 'updated_at': timezone.now()})
+                old_names.add(name)
+                moved += 1
+            self.stdout.write(f'{model.__name__}: moved {moved} images')
+
+        # the old files are only deleted once every object using them has been moved
+        for name in old_names:
+            default_storage.delete(name)
+        self.stdout.write(f'Deleted {len(old_names)} old files; run generate_image_variants to remake their resized copies')
+        self.stdout.write(self.style.SUCCESS('Done'))
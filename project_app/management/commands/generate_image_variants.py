@@ -0,0 +1,31 @@
+# File: generate_image_variants.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that generates the resized copies of images uploaded before the derivative pipeline existed
+
+from django.core.management.base import BaseCommand
+
+from project_app import images
+from project_app.models import User, Post, Pattern, InventoryItem
+
+# each model with an image: (model, image field, variants field)
+IMAGE_MODELS = [
+    (User, 'avatar', 'avatar_variants'),
+    (Post, 'image', 'image_variants'),
+    (Pattern, 'image', 'image_variants'),
+    (InventoryItem, 'image', 'image_variants'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Generates the missing or out of date image derivatives for every uploaded image'
+
+    def handle(self, *args, **options):
+        '''walks each model with an image and refreshes its derivatives'''
+        for model, field, variants_field in IMAGE_MODELS:
+            generated = 0
+            objects = model.objects.exclude(**{field: ''}).only('pk', field, variants_field)
+            for instance in objects.iterator():
+                if images.refresh_derivatives(instance, field, variants_field):
+                    generated += 1
+            self.stdout.write(f'{model.__name__}: generated derivatives for {generated} images')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,30 @@
+# File: rebuild_timelines.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that regenerates the materialized home timelines from the Post and Follow tables
+
+from django.core.management.base import BaseCommand
+
+from project_app import timeline
+from project_app.models import User
+
+
+class Command(BaseCommand):
+    help = 'Regenerates home timelines from the Post and Follow tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', help='only rebuild the timeline of this user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=500, help='number of users loaded at a time')
+
+    def handle(self, *args, **options):
+        '''rebuilds the timelines of the chosen users (or everyone) in batches'''
+        users = User.objects.only('id').order_by('id')
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+
+        rebuilt = 0
+        batch_size = options['batch_size']
+        for start in range(0, users.count(), batch_size):
+            batch = list(users[start:start + batch_size])
+            timeline.rebuild(batch)
+            rebuilt += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timelines'))
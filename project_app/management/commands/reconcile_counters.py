@@ -0,0 +1,22 @@
+# File: reconcile_counters.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that recounts the denormalized follower, like, comment and save counters
+# and fixes any that have drifted (e.g. after rows were changed outside of the app)
+
+from django.core.management.base import BaseCommand
+
+from project_app import counters
+
+
+class Command(BaseCommand):
+    help = 'Recounts the follower, like, comment and save counters in batches, fixing any that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=counters.BATCH_SIZE, help='how many rows to recount per query')
+
+    def handle(self, *args, **options):
+        '''recounts every counter column'''
+        fixed = counters.reconcile(options['batch_size'])
+        for name, rows in fixed.items():
+            self.stdout.write(f'{name}: fixed {rows} rows')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,23 @@
+# File: refresh_explore.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that rebuilds (or just trims) the ranked candidate pool behind the explore page
+
+from django.core.management.base import BaseCommand
+
+from project_app import explore
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the explore candidate pool from recent posts, or trims it back to its maximum size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trim', action='store_true', help='only drop the lowest ranked posts past the pool size')
+
+    def handle(self, *args, **options):
+        '''rebuilds or trims the pool'''
+        if options['trim']:
+            removed = explore.trim_pool()
+            self.stdout.write(self.style.SUCCESS(f'Trimmed {removed} posts from the explore pool'))
+            return
+        size = explore.refresh_pool()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the explore pool with {size} posts'))
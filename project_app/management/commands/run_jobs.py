@@ -0,0 +1,48 @@
+# File: run_jobs.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that runs the background job worker
+
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from project_app import explore, jobs, replicas, typeahead
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs until stopped (or until the queue is empty with --burst)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', help='exit once there are no more ready jobs')
+        parser.add_argument('--sleep', type=float, default=1.0, help='seconds to wait when the queue is empty')
+        parser.add_argument('--purge-days', type=int, default=7, help='delete finished jobs older than this many days')
+
+    def handle(self, *args, **options):
+        '''claims and runs jobs one at a time, finishing the current job before stopping on SIGTERM/SIGINT'''
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        purged = jobs.purge_finished(timedelta(days=options['purge_days']))
+        self.stdout.write(f'Worker started (purged {purged} finished jobs)')
+        ran = 0
+        while not self.stopping:
+            # keep the replication heartbeat current, so the web processes can tell how far each replica lags
+            replicas.beat()
+            # new posts grow the explore pool past its size between refreshes
+            explore.trim()
+            # follower counts drift from the copies the typeahead index is ranked by
+            typeahead.refresh()
+            if jobs.run_next():
+                ran += 1
+            elif options['burst']:
+                break
+            else:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Worker stopped after running {ran} jobs'))
+
+    def stop(self, signum, frame):
+        '''asks the worker loop to stop after the current job'''
+        self.stopping = True
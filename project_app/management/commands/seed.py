@@ -0,0 +1,235 @@
+# File: seed.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that fills the database with synthetic users, posts, patterns, inventory,
+# follows, likes and comments (with a power-law follow graph, like a real social network) for benchmarking
+
+import contextlib
+import itertools
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from project_app import counters, explore, graph, response_cache, search, suggestions, timeline, typeahead
+from project_app.models import Comment, Follow, InventoryItem, Like, Pattern, Post, User, UserSearchTerm
+
+# every seeded account has this password (so the benchmark can log in as one)
+SEED_PASSWORD = 'seed-password'
+# seeded accounts have emails at this domain, so they are easy to tell apart from real ones
+SEED_DOMAIN = 'seed.example.com'
+
+FIRST_NAMES = ['Ada', 'Bea', 'Cal', 'Dee', 'Eli', 'Fay', 'Gus', 'Hal', 'Ivy', 'Jo', 'Kit', 'Lou', 'Mae', 'Ned', 'Oona', 'Pip']
+GARMENTS = ['hat', 'scarf', 'mittens', 'sweater', 'socks', 'blanket', 'cowl', 'shawl', 'cardigan', 'tote']
+STYLES = ['cabled', 'striped', 'lace', 'chunky', 'simple', 'seamless', 'fair isle', 'ribbed', 'brioche', 'granny square']
+FIBERS = ['merino', 'alpaca', 'cotton', 'mohair', 'linen', 'acrylic', 'silk', 'cashmere']
+
+
+def heavy_tailed(mean, cap):
+    '''a random whole number with the given mean, drawn from a pareto distribution (most are small, a few are
+    huge), at most cap'''
+    # a pareto variate with shape 1.5 has a mean of 3
+    return min(round(mean * random.paretovariate(1.5) / 3), cap)
+
+
+def chosen(population, cum_weights, count, exclude=None):
+    '''count distinct members of population picked by weight, leaving out exclude'''
+    picked = set()
+    # tries are bounded, so a small population can't make this loop forever
+    for _ in range(4):
+        wanted = count - len(picked)
+        if wanted <= 0:
+            break
+        picked.update(random.choices(population, cum_weights=cum_weights, k=wanted))
+        picked.discard(exclude)
+    return list(picked)[:count]
+
+
+def time_between(start, end):
+    '''a random moment between start and end'''
+    return start + (end - start) * random.random()
+
+
+@contextlib.contextmanager
+def explicit_timestamps(*models):
+    '''lets the auto_now and auto_now_add fields of the models keep the values they are given (so seeded rows
+    can be spread out in time), restoring the fields afterwards'''
+    fields = [field for model in models for field in model._meta.concrete_fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def in_batches(rows, size):
+    '''splits an iterable of rows into lists of at most size'''
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with synthetic data (a power-law follow graph, posts, patterns, likes...) for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='how many users to create')
+        parser.add_argument('--posts', type=float, default=10, help='posts per user, on average')
+        parser.add_argument('--patterns', type=float, default=2, help='patterns per user, on average')
+        parser.add_argument('--items', type=float, default=5, help='inventory items per user, on average')
+        parser.add_argument('--follows', type=float, default=20, help='accounts each user follows, on average')
+        parser.add_argument('--likes', type=float, default=5, help='likes per post, on average')
+        parser.add_argument('--comments', type=float, default=1, help='comments per post, on average')
+        parser.add_argument('--alpha', type=float, default=1.1, help='the power-law exponent of account popularity')
+        parser.add_argument('--days', type=int, default=30, help='the content is spread over this many days')
+        parser.add_argument('--prefix', default='seed', help='the start of the seeded usernames and emails')
+        parser.add_argument('--random-seed', type=int, default=42, help='the seed of the random generator (runs are repeatable)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='rows inserted per statement batch')
+        parser.add_argument('--skip-derived', action='store_true', help="don't rebuild timelines, counters, indexes, etc.")
+
+    def handle(self, *args, **options):
+        '''writes the rows with bulk_create (which sends no signals), then rebuilds the data the signals would have kept up to date'''
+        random.seed(options['random_seed'])
+        prefix = options['prefix']
+        if User.objects.filter(email=f'{prefix}0@{SEED_DOMAIN}').exists():
+            raise CommandError(f'users with the prefix {prefix} were already seeded; pick another --prefix or use a fresh database')
+        self.batch_size = options['batch_size']
+        self.end = timezone.now()
+        self.start = self.end - timedelta(days=options['days'])
+        self.totals = {}
+        started = time.perf_counter()
+
+        with explicit_timestamps(User, Post, Pattern, InventoryItem):
+            users = self.step('users', self.create_users, prefix, options['users'])
+            # popularity follows a power law over the users in a random order: the k-th most popular account
+            # is followed (and liked) about k^alpha times less than the most popular one
+            ranked = random.sample(users, len(users))
+            cum_weights = list(itertools.accumulate(1 / (rank + 1) ** options['alpha'] for rank in range(len(ranked))))
+            self.step('follows', self.create_follows, users, ranked, cum_weights, options['follows'])
+            patterns = self.step('patterns', self.create_patterns, users, options['patterns'])
+            posts = self.step('posts', self.create_posts, users, patterns, options['posts'])
+            self.step('inventory items', self.create_items, users, options['items'])
+            self.step('likes', self.create_likes, posts, ranked, cum_weights, options['likes'])
+            self.step('comments', self.create_comments, posts, ranked, cum_weights, options['comments'])
+
+        if not options['skip_derived']:
+            self.step('derived data', self.rebuild_derived, users, patterns)
+        rows = sum(self.totals.values())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {rows} rows in {time.perf_counter() - started:.1f}s'))
+
+    def step(self, name, function, *args):
+        '''runs one seeding step in its own transaction and reports how long it took'''
+        started = time.perf_counter()
+        with transaction.atomic():
+            result = function(*args)
+        count = self.totals.get(name)
+        detail = f'{count} rows, ' if count is not None else ''
+        self.stdout.write(f'{name}: {detail}{time.perf_counter() - started:.1f}s')
+        return result
+
+    def insert(self, name, model, rows):
+        '''bulk inserts rows (an iterable of unsaved objects) in batches, returning them'''
+        created = []
+        for batch in in_batches(rows, self.batch_size):
+            created += model.objects.bulk_create(batch, batch_size=self.batch_size)
+        self.totals[name] = self.totals.get(name, 0) + len(created)
+        return created
+
+    def create_users(self, prefix, count):
+        password = make_password(SEED_PASSWORD)
+        def users():
+            for i in range(count):
+                joined = time_between(self.start, self.end)
+                yield User(
+                    email=f'{prefix}{i}@{SEED_DOMAIN}', username=f'{prefix}{i}', name=f'{random.choice(FIRST_NAMES)} {prefix.title()}{i}',
+                    password=password, bio=f'knits {random.choice(GARMENTS)}s in {random.choice(FIBERS)}',
+                    date_joined=joined, updated_at=joined,
+                )
+        return self.insert('users', User, users())
+
+    def create_follows(self, users, ranked, cum_weights, mean):
+        # how many accounts each user follows is heavy tailed too
+        def follows():
+            for user in users:
+                for followed in chosen(ranked, cum_weights, heavy_tailed(mean, len(users) - 1), exclude=user):
+                    yield Follow(follower_id=user.id, following_id=followed.id)
+        self.insert('follows', Follow, follows())
+
+    def create_patterns(self, users, mean):
+        difficulties = [value for value, _ in Pattern.DIFFICULTY_TYPES]
+        def patterns():
+            for user in users:
+                for _ in range(heavy_tailed(mean, 1000)):
+                    garment = random.choice(GARMENTS)
+                    created_at = time_between(self.start, self.end)
+                    yield Pattern(
+                        creator_id=user.id, name=f'{random.choice(STYLES)} {garment}'.title(), difficulty=random.choice(difficulties),
+                        description=f'a {random.choice(STYLES)} {garment} in {random.choice(FIBERS)}, worked {random.choice(["flat", "in the round"])}',
+                        image=f'uploads/patterns/{garment}.jpg', created_at=created_at, updated_at=created_at,
+                    )
+        return self.insert('patterns', Pattern, patterns())
+
+    def create_posts(self, users, patterns, mean):
+        def posts():
+            for user in users:
+                for _ in range(heavy_tailed(mean, 10000)):
+                    pattern = random.choice(patterns) if patterns and random.random() < 0.3 else None
+                    created_at = time_between(self.start, self.end)
+                    yield Post(
+                        user_id=user.id, pattern_id=pattern.id if pattern else None, created_at=created_at, updated_at=created_at,
+                        caption=f'finished my {random.choice(GARMENTS)}! {random.choice(FIBERS)}, {random.choice([3, 4, 5, 6])}mm needles',
+                        image=f'uploads/posts/{random.choice(GARMENTS)}.jpg' if random.random() < 0.7 else '',
+                    )
+        return self.insert('posts', Post, posts())
+
+    def create_items(self, users, mean):
+        item_types = [value for value, _ in InventoryItem.ITEM_TYPES]
+        def items():
+            for user in users:
+                for _ in range(heavy_tailed(mean, 1000)):
+                    created_at = time_between(self.start, self.end)
+                    yield InventoryItem(
+                        user_id=user.id, item_type=random.choice(item_types), created_at=created_at, updated_at=created_at,
+                        name=f'{random.choice(FIBERS)} {random.choice(["yarn", "skein", "needles", "hook"])}', description='',
+                    )
+        self.insert('inventory items', InventoryItem, items())
+
+    def create_likes(self, posts, ranked, cum_weights, mean):
+        def likes():
+            for post in posts:
+                for user in chosen(ranked, cum_weights, heavy_tailed(mean, len(ranked))):
+                    yield Like(post_id=post.id, user_id=user.id)
+        self.insert('likes', Like, likes())
+
+    def create_comments(self, posts, ranked, cum_weights, mean):
+        def comments():
+            for post in posts:
+                for _ in range(heavy_tailed(mean, 1000)):
+                    user = random.choices(ranked, cum_weights=cum_weights)[0]
+                    yield Comment(post_id=post.id, user_id=user.id, comment=f'love the {random.choice(FIBERS)}!')
+        self.insert('comments', Comment, comments())
+
+    def rebuild_derived(self, users, patterns):
+        '''does in bulk what the save signals do one row at a time'''
+        counters.reconcile()
+        graph.bump_version()
+        # who counts as a popular author depends on the follower counts just recounted
+        cache.delete('timeline:popular_authors')
+        for batch in in_batches(users, 500):
+            timeline.rebuild(batch)
+        for batch in in_batches(users, 500):
+            UserSearchTerm.objects.bulk_create([term for user in batch for term in typeahead.terms_for(user)], batch_size=self.batch_size)
+        # the users in memory predate the recount, so the prefix rows are ranked from the database
+        typeahead.refresh_ranks()
+        for batch in in_batches(patterns, self.batch_size):
+            search.index_new_patterns(batch)
+        explore.refresh_pool()
+        suggestions.compute(everyone=True)
+        response_cache.invalidate('patterns')
@@ -0,0 +1,44 @@
+# File: sync_replica.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a management command that copies the primary SQLite database over the local replica file
+# (SQLITE_REPLICA_PATH), standing in for replication when trying the replica router locally
+
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from project_app import replicas
+
+
+class Command(BaseCommand):
+    help = 'Copies the primary SQLite database to the replica file, once or every --every seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='replica', help='the replica database alias to copy to')
+        parser.add_argument('--every', type=float, help='keep copying, this many seconds apart')
+
+    def handle(self, *args, **options):
+        alias = options['alias']
+        if alias not in connections.settings or connections.settings[alias]['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError(f'{alias} is not a SQLite database (set SQLITE_REPLICA_PATH)')
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('the primary is not a SQLite database')
+        while True:
+            self.copy(alias)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def copy(self, alias):
+        '''writes a new heartbeat on the primary, then copies the whole primary into the replica file'''
+        replicas.beat(force=True)
+        connections['default'].ensure_connection()
+        replica = sqlite3.connect(connections.settings[alias]['NAME'], timeout=20)
+        try:
+            # the backup api copies a consistent snapshot, even while the primary is being written to
+            connections['default'].connection.backup(replica)
+        finally:
+            replica.close()
+        self.stdout.write(f'Copied the primary to {alias}')
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0011_alter_pattern_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='inventory_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pattern',
+            index=models.Index(fields=['-created_at', '-id'], name='pattern_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pattern',
+            index=models.Index(fields=['creator', '-created_at', '-id'], name='pattern_creator_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='post_user_created_idx'),
+        ),
+    ]
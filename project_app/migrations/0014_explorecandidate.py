@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0013_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExploreCandidate',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='explore_candidate', serialize=False, to='project_app.post')),
+                ('rank', models.FloatField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-rank', '-post'], name='explore_rank_idx')],
+            },
+        ),
+    ]
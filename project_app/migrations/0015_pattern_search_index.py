@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+from django.db import migrations
+
+FTS_TABLE = 'project_app_pattern_fts'
+
+
+def create_search_index(apps, schema_editor):
+    '''creates the full-text index for the database in use and fills it with the existing patterns'''
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"name, description, pattern_id UNINDEXED, tokenize='porter unicode61', prefix='2 3')"
+        )
+        Pattern = apps.get_model('project_app', 'Pattern')
+        pk = Pattern._meta.pk
+        rows = [
+            (pattern_id.int >> 68, name, description, pk.get_db_prep_value(pattern_id, connection))
+            for pattern_id, name, description in Pattern.objects.values_list('id', 'name', 'description').iterator()
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description, pattern_id) VALUES (%s, %s, %s, %s)', rows,
+            )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX pattern_search_idx ON project_app_pattern USING GIN "
+            "(to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    '''drops the full-text index'''
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS pattern_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0014_explorecandidate'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
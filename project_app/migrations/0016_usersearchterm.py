@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:58
+
+import django.db.models.deletion
+import re
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+def index_existing_users(apps, schema_editor):
+    '''fills the typeahead index with the existing users (the same terms as typeahead.terms_for)'''
+    User = apps.get_model('project_app', 'User')
+    UserSearchTerm = apps.get_model('project_app', 'UserSearchTerm')
+    normalize = lambda text: ' '.join((text or '').lower().split())[:64]
+    trigrams = lambda text: {text[i:i + 3] for i in range(len(text) - 2)}
+    rows = []
+    for user in User.objects.only('id', 'username', 'name').iterator():
+        username, name = normalize(user.username), normalize(user.name)
+        terms = {username, name} | set(re.findall(r'\w+', name))
+        rows += [UserSearchTerm(user_id=user.id, kind='word', term=term) for term in terms if term]
+        rows += [UserSearchTerm(user_id=user.id, kind='trigram', term=gram) for gram in trigrams(username) | trigrams(name)]
+    UserSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0015_pattern_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('word', 'Word'), ('trigram', 'Trigram')], max_length=10)),
+                ('term', models.CharField(max_length=64)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'term', 'user'], name='user_search_term_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_users, migrations.RunPython.noop),
+    ]
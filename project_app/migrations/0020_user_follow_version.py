@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0019_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='follow_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# (counted model, counter field, relationship model, foreign key), as in counters.COUNTERS
+COUNTERS = [
+    ('User', 'follower_count', 'Follow', 'following'),
+    ('User', 'following_count', 'Follow', 'follower'),
+    ('Post', 'like_count', 'Like', 'post'),
+    ('Post', 'comment_count', 'Comment', 'post'),
+    ('Post', 'save_count', 'SavedPost', 'post'),
+    ('Pattern', 'save_count', 'SavedPattern', 'pattern'),
+]
+
+
+def count_existing(apps, schema_editor):
+    '''sets each new counter from the rows that already exist, with one UPDATE per counter'''
+    for model_name, field, relationship_name, foreign_key in COUNTERS:
+        model = apps.get_model('project_app', model_name)
+        relationship = apps.get_model('project_app', relationship_name)
+        rows = (
+            relationship.objects.filter(**{foreign_key: OuterRef('pk')})
+            .order_by().values(foreign_key).annotate(total=Count('pk')).values('total')
+        )
+        model.objects.update(**{field: Coalesce(Subquery(rows), Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0020_user_follow_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pattern',
+            name='save_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='save_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:22
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0021_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestionRefresh',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('requested_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Suggestion',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('mutual_count', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField()),
+                ('suggested', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-score', 'suggested'], name='suggestion_user_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'suggested'), name='suggestion_unique_user_suggested')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0022_suggestions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicationHeartbeat',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, primary_key=True, serialize=False)),
+                ('beat_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# each relationship table and the pair of columns that becomes unique
+RELATIONSHIPS = [
+    ('Follow', ('follower', 'following')),
+    ('Like', ('user', 'post')),
+    ('SavedPost', ('user', 'post')),
+    ('SavedPattern', ('user', 'pattern')),
+]
+# the counters of those tables, as in counters.COUNTERS
+COUNTERS = [
+    ('User', 'follower_count', 'Follow', 'following'),
+    ('User', 'following_count', 'Follow', 'follower'),
+    ('Post', 'like_count', 'Like', 'post'),
+    ('Post', 'save_count', 'SavedPost', 'post'),
+    ('Pattern', 'save_count', 'SavedPattern', 'pattern'),
+]
+
+
+def remove_duplicates(apps, schema_editor):
+    '''keeps one row of each duplicated pair (so the unique constraints can be added), then recounts the
+    counters the removed rows were counted in'''
+    removed = 0
+    for model_name, fields in RELATIONSHIPS:
+        model = apps.get_model('project_app', model_name)
+        duplicated = model.objects.values(*fields).annotate(rows=Count('pk'), keep=Min('pk')).filter(rows__gt=1)
+        for pair in duplicated.iterator():
+            removed += model.objects.filter(**{field: pair[field] for field in fields}).exclude(pk=pair['keep']).delete()[0]
+    if not removed:
+        return
+    for model_name, field, relationship_name, foreign_key in COUNTERS:
+        model = apps.get_model('project_app', model_name)
+        relationship = apps.get_model('project_app', relationship_name)
+        rows = (
+            relationship.objects.filter(**{foreign_key: OuterRef('pk')})
+            .order_by().values(foreign_key).annotate(total=Count('pk')).values('total')
+        )
+        model.objects.update(**{field: Coalesce(Subquery(rows), Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0023_replication_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='follow',
+            name='follower',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='following',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='like',
+            name='post',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='project_app.post'),
+        ),
+        migrations.AlterField(
+            model_name='like',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='savedpattern',
+            name='pattern',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='project_app.pattern'),
+        ),
+        migrations.AlterField(
+            model_name='savedpattern',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='savedpost',
+            name='post',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='project_app.post'),
+        ),
+        migrations.AlterField(
+            model_name='savedpost',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['following', 'follower'], name='follow_following_follower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['post', 'user'], name='like_post_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedpattern',
+            index=models.Index(fields=['pattern', 'user'], name='savedpattern_pattern_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedpost',
+            index=models.Index(fields=['post', 'user'], name='savedpost_post_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('follower', 'following'), name='follow_unique_follower_following'),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='like_unique_user_post'),
+        ),
+        migrations.AddConstraint(
+            model_name='savedpattern',
+            constraint=models.UniqueConstraint(fields=('user', 'pattern'), name='savedpattern_unique_user_pattern'),
+        ),
+        migrations.AddConstraint(
+            model_name='savedpost',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='savedpost_unique_user_post'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations
+
+# as in timeline.py
+FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+BACKFILL_SIZE = getattr(settings, 'TIMELINE_BACKFILL_SIZE', 100)
+BATCH_SIZE = 1000
+
+
+def backfill_timelines(apps, schema_editor):
+    '''fills the timelines of existing users, which were only written for posts and follows made after 0013:
+    each user gets their own posts and the recent posts of the authors they follow (but not the popular
+    authors, whose posts are merged in when the timeline is read), as timeline.rebuild does'''
+    User = apps.get_model('project_app', 'User')
+    Follow = apps.get_model('project_app', 'Follow')
+    Post = apps.get_model('project_app', 'Post')
+    TimelineEntry = apps.get_model('project_app', 'TimelineEntry')
+
+    popular = set(User.objects.filter(follower_count__gt=FANOUT_LIMIT).values_list('id', flat=True))
+    recent = defaultdict(list)
+    posts = Post.objects.order_by('user', '-created_at', '-id').values_list('id', 'user', 'created_at')
+    for post_id, author_id, created_at in posts.iterator():
+        if len(recent[author_id]) < BACKFILL_SIZE:
+            recent[author_id].append((post_id, created_at))
+    followed = defaultdict(list)
+    for follower_id, author_id in Follow.objects.values_list('follower', 'following').iterator():
+        if author_id not in popular:
+            followed[follower_id].append(author_id)
+
+    entries = []
+    for user_id in User.objects.values_list('id', flat=True).iterator():
+        for author_id in [user_id, *followed[user_id]]:
+            entries += [
+                TimelineEntry(user_id=user_id, post_id=post_id, author_id=author_id, created_at=created_at)
+                for post_id, created_at in recent[author_id]
+            ]
+        if len(entries) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+            entries = []
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0024_relationship_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:05
+
+from django.db import migrations
+
+FTS_TABLE = 'project_app_pattern_fts'
+FTS_IDS_TABLE = 'project_app_pattern_fts_ids'
+
+
+def number_patterns(apps, schema_editor):
+    '''rebuilds the sqlite full-text index with rowids from a table numbering the patterns; 0015 derived the
+    rowid from 60 bits of the pattern's uuid, so two patterns could share a rowid and overwrite each other'''
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'CREATE TABLE {FTS_IDS_TABLE} (id integer NOT NULL PRIMARY KEY, pattern_id char(32) NOT NULL UNIQUE)')
+    schema_editor.execute(f'DELETE FROM {FTS_TABLE}')
+    schema_editor.execute(f'INSERT INTO {FTS_IDS_TABLE} (pattern_id) SELECT id FROM project_app_pattern')
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, name, description, pattern_id) '
+        f'SELECT i.id, p.name, p.description, p.id FROM {FTS_IDS_TABLE} i JOIN project_app_pattern p ON p.id = i.pattern_id'
+    )
+
+
+def derive_rowids(apps, schema_editor):
+    '''goes back to the rowids of 0015'''
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_IDS_TABLE}')
+    schema_editor.execute(f'DELETE FROM {FTS_TABLE}')
+    Pattern = apps.get_model('project_app', 'Pattern')
+    pk = Pattern._meta.pk
+    rows = [
+        (pattern_id.int >> 68, name, description, pk.get_db_prep_value(pattern_id, connection))
+        for pattern_id, name, description in Pattern.objects.values_list('id', 'name', 'description').iterator()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, description, pattern_id) VALUES (%s, %s, %s, %s)', rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0026_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(number_patterns, derive_rowids),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0027_pattern_search_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventoryitem',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='pattern',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:07
+
+from django.db import migrations, models
+
+
+def index_existing_prefixes(apps, schema_editor):
+    '''adds the prefix rows for the existing users' words (the same rows as typeahead.terms_for)'''
+    User = apps.get_model('project_app', 'User')
+    UserSearchTerm = apps.get_model('project_app', 'UserSearchTerm')
+    follower_counts = dict(User.objects.values_list('id', 'follower_count'))
+    rows = []
+    for user_id, term in UserSearchTerm.objects.filter(kind='word').values_list('user_id', 'term').iterator():
+        rows += [(user_id, term[:i]) for i in range(1, min(len(term), 10) + 1)]
+    UserSearchTerm.objects.bulk_create(
+        [UserSearchTerm(user_id=user_id, kind='prefix', term=prefix, follower_count=follower_counts[user_id]) for user_id, prefix in set(rows)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0028_created_at_is_fixed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersearchterm',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='usersearchterm',
+            name='kind',
+            field=models.CharField(choices=[('word', 'Word'), ('prefix', 'Prefix'), ('trigram', 'Trigram')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='usersearchterm',
+            index=models.Index(fields=['kind', 'term', '-follower_count'], name='user_search_rank_idx'),
+        ),
+        migrations.RunPython(index_existing_prefixes, migrations.RunPython.noop),
+    ]
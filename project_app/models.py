@@ -3,6 +3,9 @@ from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, UserManager
 
 from django.db import models
+from django.utils import timezone
+
+from .images import size_urls
 
 # Create your models here.
 class CustomUserManager(UserManager):
@@ -39,6 +42,15 @@ class User(AbstractBaseUser, PermissionsMixin):
     bio = models.TextField(blank=True)
     link = models.URLField(blank=True)
     avatar = models.ImageField(blank=True, upload_to='uploads/avatars')
+    # the resized copies of the avatar (see images.py)
+    avatar_variants = models.JSONField(default=dict, blank=True)
+    # bumped whenever the user follows or unfollows someone, so cached copies of their feeds can be validated
+    follow_version = models.PositiveIntegerField(default=0)
+    # denormalized counts of the user's Follow rows, kept up to date by counters.py
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # when the row last changed, counters and resized images included, for the etags of list pages (see conditional.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
@@ -53,6 +65,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     EMAIL_FIELD = 'email'
     REQUIRED_FIELDS = ['name','username',]
 
+    def avatar_sizes(self, image_format='jpeg'):
+        '''a function to return a map of size name to url for the resized copies of the avatar'''
+        return size_urls(self.avatar, self.avatar_variants, image_format)
+
 class InventoryItem(models.Model):
     '''model for an item in the user's inventory (e.g. yarn, needle, hook, stuffing)'''
     ITEM_TYPES = [
@@ -67,8 +83,17 @@ class InventoryItem(models.Model):
     item_type = models.CharField(max_length=20, choices=ITEM_TYPES)
     description = models.TextField(blank=True)
     image = models.ImageField(blank=True, upload_to='uploads/inventory')
-    created_at = models.DateTimeField(auto_now=True)
+    # the resized copies of the image (see images.py)
+    image_variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # when the row last changed, counters and resized images included, for the etags of list pages (see conditional.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # keyset pagination of a user's inventory walks (created_at, id) in order
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='inventory_user_created_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -77,6 +102,10 @@ class InventoryItem(models.Model):
         '''a function to return a url for the image of the object'''
         return f'{settings.WEBSITE_URL}{self.image.url}' if self.image else ""
 
+    def image_sizes(self, image_format='jpeg'):
+        '''a function to return a map of size name to url for the resized copies of the image'''
+        return size_urls(self.image, self.image_variants, image_format)
+
 class Pattern(models.Model):
     DIFFICULTY_TYPES = [
         ('beginner', 'Beginner'),
@@ -91,8 +120,20 @@ class Pattern(models.Model):
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_TYPES)
     description = models.TextField(blank=False)
     image = models.ImageField(blank=False, upload_to='uploads/patterns')
-    created_at = models.DateTimeField(auto_now=True)
+    # the resized copies of the image (see images.py)
+    image_variants = models.JSONField(default=dict, blank=True)
+    # denormalized count of the pattern's SavedPattern rows, kept up to date by counters.py
+    save_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # when the row last changed, counters and resized images included, for the etags of list pages (see conditional.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # keyset pagination walks (created_at, id) newest first, globally and per creator
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='pattern_created_idx'),
+            models.Index(fields=['creator', '-created_at', '-id'], name='pattern_creator_created_idx'),
+        ]
 
     def __str__(self) -> str:
         return str(self.name) + ' Pattern'
@@ -101,14 +142,33 @@ class Pattern(models.Model):
         '''a function to return a url for the image of the object'''
         return f'{settings.WEBSITE_URL}{self.image.url}' if self.image else ""
 
+    def image_sizes(self, image_format='jpeg'):
+        '''a function to return a map of size name to url for the resized copies of the image'''
+        return size_urls(self.image, self.image_variants, image_format)
+
 class Post(models.Model):
     '''posts'''
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey('User', on_delete=models.CASCADE)
     image = models.ImageField(blank=True, upload_to='uploads/posts')
+    # the resized copies of the image (see images.py)
+    image_variants = models.JSONField(default=dict, blank=True)
     pattern = models.ForeignKey('Pattern', blank=True, null=True, on_delete=models.CASCADE)
     caption = models.TextField(blank=True)
-    created_at = models.DateTimeField(auto_now=True)
+    # denormalized counts of the post's Like, Comment and SavedPost rows, kept up to date by counters.py
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    save_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # when the row last changed, counters and resized images included, for the etags of list pages (see conditional.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # keyset pagination walks (created_at, id) newest first, globally and per user
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='post_user_created_idx'),
+        ]
 
     def __str__(self) -> str:
         return str(self.user) + 's post'
@@ -117,11 +177,24 @@ class Post(models.Model):
         '''a function to return a url for the image of the object'''
         return f'{settings.WEBSITE_URL}{self.image.url}' if self.image else ""
 
+    def image_sizes(self, image_format='jpeg'):
+        '''a function to return a map of size name to url for the resized copies of the image'''
+        return size_urls(self.image, self.image_variants, image_format)
+
 class SavedPattern(models.Model):
     '''saved patterns'''
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    pattern = models.ForeignKey('Pattern', on_delete=models.CASCADE)
-    user = models.ForeignKey('User', on_delete=models.CASCADE)
+    pattern = models.ForeignKey('Pattern', on_delete=models.CASCADE, db_index=False)
+    user = models.ForeignKey('User', on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        # the unique constraint's index answers "what did this user save", the other "who saved this pattern"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'pattern'], name='savedpattern_unique_user_pattern'),
+        ]
+        indexes = [
+            models.Index(fields=['pattern', 'user'], name='savedpattern_pattern_user_idx'),
+        ]
     
     def __str__(self) -> str:
         return str(self.user) + ' saved ' + str(self.pattern)
@@ -129,8 +202,16 @@ class SavedPattern(models.Model):
 class SavedPost(models.Model):
     '''saved posts'''
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    post = models.ForeignKey('Post', on_delete=models.CASCADE)
-    user = models.ForeignKey('User', on_delete=models.CASCADE)
+    post = models.ForeignKey('Post', on_delete=models.CASCADE, db_index=False)
+    user = models.ForeignKey('User', on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='savedpost_unique_user_post'),
+        ]
+        indexes = [
+            models.Index(fields=['post', 'user'], name='savedpost_post_user_idx'),
+        ]
 
     def __str__(self) -> str:
         return str(self.user) + ' saved ' + str(self.post)
@@ -138,8 +219,16 @@ class SavedPost(models.Model):
 class Like(models.Model):
     '''likes on posts'''
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    post = models.ForeignKey('Post', on_delete=models.CASCADE)
-    user = models.ForeignKey('User', on_delete=models.CASCADE)
+    post = models.ForeignKey('Post', on_delete=models.CASCADE, db_index=False)
+    user = models.ForeignKey('User', on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='like_unique_user_post'),
+        ]
+        indexes = [
+            models.Index(fields=['post', 'user'], name='like_post_user_idx'),
+        ]
 
     def __str__(self) -> str:
         return str(self.user) + ' likes ' + str(self.post)
@@ -157,8 +246,162 @@ class Comment(models.Model):
 class Follow(models.Model):
     '''a following relationship'''
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)   
-    follower = models.ForeignKey('User', on_delete=models.CASCADE,related_name='follower')
-    following = models.ForeignKey('User', on_delete=models.CASCADE, related_name='following')
+    follower = models.ForeignKey('User', on_delete=models.CASCADE,related_name='follower', db_index=False)
+    following = models.ForeignKey('User', on_delete=models.CASCADE, related_name='following', db_index=False)
+
+    class Meta:
+        # a user can follow another only once; the constraint's index answers "who does this user follow",
+        # and the reverse index "who follows this user", each without reading the table
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'following'], name='follow_unique_follower_following'),
+        ]
+        indexes = [
+            models.Index(fields=['following', 'follower'], name='follow_following_follower_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return str(self.follower) + ' follows ' + str(self.following)
+
+class TimelineEntry(models.Model):
+    '''a post delivered to a user's home timeline (written when the post or follow is created, see timeline.py)'''
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey('Post', on_delete=models.CASCADE)
+    author = models.ForeignKey('User', on_delete=models.CASCADE, related_name='+')
+    # copied from the post so that a page of the timeline is a single index range scan
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='timeline_unique_user_post'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_created_idx'),
+            models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return str(self.post) + ' on ' + str(self.user) + 's timeline'
+
+class ExploreCandidate(models.Model):
+    '''a post in the bounded, ranked pool of candidates for the explore page (see explore.py)'''
+    post = models.OneToOneField('Post', on_delete=models.CASCADE, primary_key=True, related_name='explore_candidate')
+    author = models.ForeignKey('User', on_delete=models.CASCADE, related_name='+')
+    # log(engagement) plus a recency term, so the ordering of the pool does not change with time
+    rank = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rank', '-post'], name='explore_rank_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return str(self.post) + ' in the explore pool'
+
+class UserSearchTerm(models.Model):
+    '''a term in the typeahead index over usernames and names (see typeahead.py)'''
+    TERM_KINDS = [
+        ('word', 'Word'),
+        ('prefix', 'Prefix'),
+        ('trigram', 'Trigram'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='search_terms')
+    kind = models.CharField(max_length=10, choices=TERM_KINDS)
+    term = models.CharField(max_length=64)
+    # a copy of the user's follower count on prefix rows, refreshed by the worker, so the index is already in rank order
+    follower_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'term', 'user'], name='user_search_term_idx'),
+            models.Index(fields=['kind', 'term', '-follower_count'], name='user_search_rank_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return self.term + ' -> ' + str(self.user)
+
+class Job(models.Model):
+    '''a unit of background work, run by the run_jobs worker (see jobs.py)'''
+    STATUS_TYPES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    # higher priority jobs are run first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_TYPES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # the job is not run before this time (used for retry backoff)
+    run_after = models.DateTimeField(default=timezone.now)
+    # while running, the job is invisible to other workers until this time; if the worker dies it is picked up again
+    locked_until = models.DateTimeField(blank=True, null=True)
+    # enqueueing a job with the same key as an existing one returns the existing job instead
+    idempotency_key = models.CharField(max_length=255, blank=True, null=True, unique=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after'], name='job_ready_idx'),
+            models.Index(fields=['status', 'locked_until'], name='job_locked_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return self.task + ' (' + self.status + ')'
+
+class MediaBlob(models.Model):
+    '''a stored file, named by the hash of its contents and shared by every upload of the same bytes (see storage.py)'''
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField()
+    # how many saved references to the file there are; it is deleted when this reaches zero
+    refcount = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.name + ' (' + str(self.refcount) + ' references)'
+
+class Suggestion(models.Model):
+    '''an account suggested to a user ("people you may know"), computed offline by compute_suggestions (see suggestions.py)'''
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='suggestions')
+    suggested = models.ForeignKey('User', on_delete=models.CASCADE, related_name='+')
+    # how many of the people the user follows also follow the suggested account
+    mutual_count = models.PositiveIntegerField(default=0)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='suggestion_unique_user_suggested'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score', 'suggested'], name='suggestion_user_score_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return str(self.suggested) + ' suggested to ' + str(self.user)
+
+class SuggestionRefresh(models.Model):
+    '''a user whose follows changed since their suggestions (and those of their followers) were last computed'''
+    user = models.OneToOneField('User', on_delete=models.CASCADE, primary_key=True, related_name='+')
+    requested_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return 'refresh suggestions around ' + str(self.user)
+
+class ReplicationHeartbeat(models.Model):
+    '''a single row the worker rewrites on the primary every few seconds; how old it is on a replica is how far
+    that replica lags behind (see replicas.py)'''
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    beat_at = models.DateTimeField()
 
     def __str__(self) -> str:
-        return str(self.follower) + ' follows ' + str(self.following)
\ No newline at end of file
+        return 'heartbeat at ' + str(self.beat_at)
@@ -0,0 +1,106 @@
+# File: pagination.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the keyset (cursor) pagination used by every list view in api.py
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError as ModelValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+# default and maximum number of rows returned in a single page
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValidationError):
+    '''raised when a cursor sent by the client cannot be decoded (answered with a 400 by the api views)'''
+
+
+def encode_cursor(values):
+    '''encodes the ordering values of the last row on a page into an opaque, url safe cursor'''
+    raw = json.dumps([str(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    '''decodes a cursor produced by encode_cursor back into its list of ordering values'''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        raise InvalidCursor({'cursor': 'invalid cursor'})
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor({'cursor': 'invalid cursor'})
+    return values
+
+
+def get_limit(request):
+    '''reads the limit query parameter, clamped to the range the api allows'''
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def after_cursor(queryset, ordering, values):
+    '''filters a queryset down to the rows strictly after the given ordering values
+
+    ordering is a tuple like ('-created_at', '-id'); the last field must be unique so
+    that the ordering is total and no row is ever skipped or repeated between pages'''
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        # (a > x) OR (a = x AND b > y) OR ...
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    try:
+        return queryset.filter(condition)
+    except ModelValidationError:
+        # the cursor decoded but holds values that don't fit the ordering columns
+        raise InvalidCursor({'cursor': 'invalid cursor'})
+
+
+def cursor_values(row, ordering):
+    '''reads the ordering values off of a model instance'''
+    return [getattr(row, field.lstrip('-')) for field in ordering]
+
+
+def page_window(request, queryset, ordering):
+    '''the (unevaluated) rows of the requested page plus one extra row, which tells whether there is a next page'''
+    queryset = queryset.order_by(*ordering)
+
+    # continue after the last row the client has seen
+    cursor = request.GET.get('cursor')
+    if cursor:
+        queryset = after_cursor(queryset, ordering, decode_cursor(cursor, len(ordering)))
+    return queryset[:get_limit(request) + 1]
+
+
+def paginate(request, queryset, ordering=('-created_at', '-id')):
+    '''returns one page of the queryset (a list) and the cursor for the next page (or None)
+
+    the page is found with an indexed range scan on the ordering columns, so the cost of
+    a page does not depend on how far the client has scrolled'''
+    limit = get_limit(request)
+    rows = list(page_window(request, queryset, ordering))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(cursor_values(rows[-1], ordering))
+    return rows, next_cursor
+
+
+async def apaginate(request, queryset, ordering=('-created_at', '-id')):
+    '''paginate, reading the page with the async ORM (for the views in async_api.py)'''
+    limit = get_limit(request)
+    rows = [row async for row in page_window(request, queryset, ordering)]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(cursor_values(rows[-1], ordering))
+    return rows, next_cursor
@@ -0,0 +1,85 @@
+# File: renderers.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the renderers the api responds with: JSON encoded with orjson (falling back to
+# the standard library when it isn't installed), and MessagePack for clients that ask for it in their Accept header
+
+import json
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from rest_framework.renderers import BaseRenderer
+
+logger = logging.getLogger(__name__)
+
+# both are in the Pipfile; the fallbacks keep a checkout without them working, but slower
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logger.warning('orjson is not installed, so api responses are encoded with the slower standard json module')
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+    logger.warning('msgpack is not installed, so api responses are only sent as json')
+
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+# encodes what orjson and msgpack don't encode themselves (datetimes, lazy translations, decimals, and for msgpack uuids)
+django_encoder = DjangoJSONEncoder()
+
+
+def fallback(value):
+    '''a value the fast encoders can't handle, as the standard JSON encoder would write it'''
+    return django_encoder.default(value)
+
+
+def dumps(data):
+    '''encodes data as compact JSON bytes (uuids natively; datetimes are passed to fallback so they are
+    written exactly as JsonResponse wrote them, to the millisecond)'''
+    if orjson is not None:
+        return orjson.dumps(data, default=fallback, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+
+def response_format(request):
+    '''the format a request's response is rendered in, 'msgpack' or 'json' (used in cache keys and etags)'''
+    accept = request.META.get('HTTP_ACCEPT', '') if request is not None else ''
+    if msgpack is not None and MSGPACK_MEDIA_TYPE in accept:
+        return 'msgpack'
+    return 'json'
+
+
+class FastJSONRenderer(BaseRenderer):
+    '''renders api responses as JSON with orjson'''
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
+
+
+class MessagePackRenderer(BaseRenderer):
+    '''renders api responses as MessagePack, for clients sending Accept: application/msgpack (needs the msgpack package)'''
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=fallback)
+
+
+def render_response(request, data, status=200):
+    '''renders data for a plain django view the way the renderers render api responses, in the format
+    the request's Accept header asks for'''
+    if response_format(request) == 'msgpack':
+        return HttpResponse(MessagePackRenderer().render(data), status=status, content_type=MSGPACK_MEDIA_TYPE)
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
@@ -0,0 +1,172 @@
+# File: replicas.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the read replica routing: GET requests read from a replica database, except
+# for a client that has just written (so it reads its own writes) and except when the replicas lag too far behind
+
+import contextvars
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from . import authentication
+from .models import ReplicationHeartbeat
+
+# after a client writes, its reads go to the primary for this many seconds (longer than the replicas should lag)
+PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+# the cache alias the pins are kept in, which every process must see (the next request may go to another one)
+PIN_CACHE_ALIAS = getattr(settings, 'REPLICA_PIN_CACHE', 'default')
+# a replica whose heartbeat is older than this (in seconds) is skipped until it catches up
+MAX_LAG = getattr(settings, 'REPLICA_MAX_LAG', 5)
+# how often (in seconds) each process checks each replica's lag
+LAG_CHECK_INTERVAL = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 2)
+# how often (in seconds) the worker rewrites the heartbeat
+HEARTBEAT_INTERVAL = 1
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# whether the current request may read from a replica (only requests routed by the middleware do)
+use_replica = contextvars.ContextVar('use_replica', default=False)
+
+# {replica alias: (when it was checked, whether it was current)}, for this process
+lag_checks = {}
+lag_lock = threading.Lock()
+last_beat = 0
+
+
+def replica_aliases():
+    '''the database aliases reads can be sent to (DATABASE_REPLICAS in settings.py)'''
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_key(user_id):
+    '''the cache key pinning a user to the primary'''
+    return f'replica_pin:{user_id}'
+
+
+def request_pin_key(request):
+    '''the pin key of the user a request is authenticated as, from its access token (so a refreshed token
+    keeps the pin), or None for anonymous clients and bad tokens, whose reads are never pinned'''
+    jwt = JWTAuthentication()
+    try:
+        header = jwt.get_header(request)
+        raw_token = jwt.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+        # the token cache skips the signature check of a token verified in the last few seconds
+        cached = authentication.cached_user(raw_token)
+        if cached is not None:
+            return pin_key(cached[0].pk)
+        validated_token = jwt.get_validated_token(raw_token)
+    except AuthenticationFailed:
+        return None
+    user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+    return pin_key(user_id) if user_id is not None else None
+
+
+def lag(alias):
+    '''how far (in seconds) a replica lags behind the primary, by the age of its copy of the heartbeat'''
+    beat_at = ReplicationHeartbeat.objects.using(alias).filter(pk=1).values_list('beat_at', flat=True).first()
+    if beat_at is None:
+        return None
+    return (timezone.now() - beat_at).total_seconds()
+
+
+def is_current(alias):
+    '''whether a replica is reachable and within MAX_LAG of the primary (checked at most every LAG_CHECK_INTERVAL)'''
+    now = time.monotonic()
+    checked = lag_checks.get(alias)
+    if checked is not None and now - checked[0] < LAG_CHECK_INTERVAL:
+        return checked[1]
+    try:
+        seconds = lag(alias)
+        current = seconds is not None and seconds <= MAX_LAG
+    except DatabaseError:
+        current = False
+    with lag_lock:
+        lag_checks[alias] = (now, current)
+    return current
+
+
+def beat(force=False):
+    '''rewrites the heartbeat on the primary (at most every HEARTBEAT_INTERVAL, unless forced); called by the
+    worker loop, and by sync_replica before each copy'''
+    global last_beat
+    if not force and (not replica_aliases() or time.monotonic() - last_beat < HEARTBEAT_INTERVAL):
+        return
+    ReplicationHeartbeat.objects.using('default').update_or_create(pk=1, defaults={'beat_at': timezone.now()})
+    last_beat = time.monotonic()
+
+
+class ReplicaRouter:
+    '''sends the reads of requests routed to a replica to a current one, and everything else to the primary'''
+
+    def db_for_read(self, model, **hints):
+        if not use_replica.get():
+            return None
+        current = [alias for alias in replica_aliases() if is_current(alias)]
+        return random.choice(current) if current else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema by replicating the primary
+        return db not in replica_aliases()
+
+
+class ReplicaRoutingMiddleware:
+    '''lets safe requests read from the replicas, unless the client wrote within the last PIN_SECONDS;
+    a successful unsafe request pins the client to the primary'''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        cache = caches[PIN_CACHE_ALIAS]
+        key = request_pin_key(request) if replica_aliases() else None
+        token = use_replica.set(self.may_use_replica(request, key and cache.get(key)))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if self.pins(request, key, response):
+            cache.set(key, True, PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        cache = caches[PIN_CACHE_ALIAS]
+        key = request_pin_key(request) if replica_aliases() else None
+        token = use_replica.set(self.may_use_replica(request, key and await cache.aget(key)))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if self.pins(request, key, response):
+            await cache.aset(key, True, PIN_SECONDS)
+        return response
+
+    def may_use_replica(self, request, pinned):
+        return bool(replica_aliases()) and request.method in SAFE_METHODS and not pinned
+
+    def pins(self, request, key, response):
+        return key is not None and bool(replica_aliases()) and request.method not in SAFE_METHODS and response.status_code < 400
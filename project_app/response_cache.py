@@ -0,0 +1,145 @@
+# File: response_cache.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the response cache for public, read-heavy api views: responses are cached
+# by url name and arguments, and tagged with the objects they show so an edit only invalidates those
+
+import contextvars
+import functools
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.urls import resolve
+
+from .images import preferred_format
+from .renderers import response_format
+from .replicas import use_replica
+from .models import Follow, InventoryItem, Pattern, Post, User
+
+# the django cache the responses are kept in, and the one the versions of their tags are kept in (see CACHES in
+# settings.py); every process must see the same versions, since any of them (the worker too) can invalidate a tag
+CACHE_ALIAS = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+VERSION_CACHE_ALIAS = getattr(settings, 'RESPONSE_CACHE_VERSION_ALIAS', 'default')
+# how long a response is kept; edits invalidate it straight away, so this only bounds how long unused entries live
+TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60 * 60)
+
+# the tags collected while the current view runs
+current_tags = contextvars.ContextVar('current_tags', default=None)
+
+
+def version_key(tag):
+    '''the cache key holding a tag's current version'''
+    return f'response_cache:version:{tag}'
+
+
+def canonical(value):
+    '''a url argument in canonical form: a uuid in any spelling (upper case, without hyphens...) becomes the
+    lowercase hyphenated form str(user.id) gives, which the tags invalidated on edits are made from'''
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return value
+
+
+def response_key(request, url_name, kwargs):
+    '''the cache key of a response: the url name and arguments, the query string (cursor, limit), and the
+    image format and response format (json or msgpack), which both depend on the Accept header'''
+    arguments = '&'.join(f'{name}={value}' for name, value in sorted(kwargs.items()))
+    raw = f'{url_name}?{arguments}?{request.META.get("QUERY_STRING", "")}?{preferred_format(request)}?{response_format(request)}'
+    return 'response_cache:response:' + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def add_tags(*tags):
+    '''marks the response being built as depending on the given tags (e.g. 'user:<id>'); called from the views'''
+    tags_so_far = current_tags.get()
+    if tags_so_far is not None:
+        tags_so_far.update(tags)
+
+
+def current_versions(cache, tags):
+    '''the current version of each tag, giving a new version to tags that don't have one yet'''
+    versions = cache.get_many([version_key(tag) for tag in tags])
+    for tag in tags:
+        if version_key(tag) not in versions:
+            # add() keeps the version another process may have just set
+            cache.add(version_key(tag), uuid.uuid4().hex, None)
+            versions[version_key(tag)] = cache.get(version_key(tag))
+    return versions
+
+
+def invalidate(*tags):
+    '''gives the tags new versions once the current transaction commits, so every response tagged with them
+    is out of date (nothing is deleted; old responses just stop being read and expire)'''
+    def bump():
+        caches[VERSION_CACHE_ALIAS].set_many({version_key(tag): uuid.uuid4().hex for tag in tags}, None)
+    # bumping only after the commit means a request running meanwhile can't cache the old data under the new version
+    transaction.on_commit(bump)
+
+
+def cached_response(*static_tags):
+    '''caches a view's successful GET responses; static_tags are tag templates filled in from the url
+    arguments (e.g. 'user:{user_id}'), and the view can add more with add_tags()'''
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            cache, version_cache = caches[CACHE_ALIAS], caches[VERSION_CACHE_ALIAS]
+            arguments = {name: canonical(value) for name, value in kwargs.items()}
+            key = response_key(request, resolve(request.path_info).url_name, arguments)
+
+            # a cached response is used only if none of its tags has changed since it was stored
+            entry = cache.get(key)
+            if entry is not None:
+                versions = version_cache.get_many(list(entry['versions']))
+                if versions == entry['versions']:
+                    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+                    response['X-Cache'] = 'hit'
+                    return response
+
+            tags = {tag.format(**arguments) for tag in static_tags}
+            collected = set(tags)
+            token = current_tags.set(collected)
+            # the view reads from the primary: a lagging replica could still have the data from before the edit
+            # that bumped a version, which would then be cached under the new version
+            replica_token = use_replica.set(False)
+            try:
+                # read the versions before running the view, so an edit made while it runs invalidates the result
+                versions = current_versions(version_cache, tags)
+                response = view(request, *args, **kwargs)
+                versions.update(current_versions(version_cache, collected - tags))
+            finally:
+                use_replica.reset(replica_token)
+                current_tags.reset(token)
+
+            if response.status_code == 200 and not response.streaming:
+                # api views return unrendered responses, rendered here so their content can be stored
+                if hasattr(response, 'render'):
+                    response.render()
+                cache.set(key, {
+                    'versions': versions,
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                }, TIMEOUT)
+                response['X-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
+
+
+def tags_for(instance):
+    '''the tags of the cached responses that show a model object'''
+    if isinstance(instance, User):
+        return [f'user:{instance.pk}']
+    if isinstance(instance, Post):
+        return [f'user:{instance.user_id}', f'post:{instance.pk}']
+    if isinstance(instance, Pattern):
+        return [f'pattern:{instance.pk}', f'user:{instance.creator_id}', 'patterns']
+    if isinstance(instance, Follow):
+        return [f'user:{instance.follower_id}', f'user:{instance.following_id}']
+    if isinstance(instance, InventoryItem):
+        return [f'user:{instance.user_id}']
+    return []
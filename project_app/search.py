@@ -0,0 +1,131 @@
+# File: search.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the full-text pattern search: an FTS5 index on sqlite and a
+# tsvector/GIN index on postgresql, both returning relevance ranked, cursor paginated results
+
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+
+from .models import Pattern
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, get_limit
+from .serializers import with_user_summary
+
+# the sqlite FTS5 table and the postgresql expression the GIN index is built on (both created by migration 0015)
+FTS_TABLE = 'project_app_pattern_fts'
+# numbers each indexed pattern (created by migration 0027): its id is the pattern's rowid in FTS_TABLE, so index
+# updates are a rowid lookup instead of a scan, and no two patterns can share a rowid
+FTS_IDS_TABLE = 'project_app_pattern_fts_ids'
+PG_DOCUMENT = "to_tsvector('english', coalesce(p.name, '') || ' ' || coalesce(p.description, ''))"
+
+NUMBER_SQL = f'INSERT OR IGNORE INTO {FTS_IDS_TABLE} (pattern_id) VALUES (%s)'
+# (replacing the row with the pattern's rowid, if it was indexed before)
+INDEX_SQL = (
+    f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, description, pattern_id) '
+    f'SELECT id, %s, %s, pattern_id FROM {FTS_IDS_TABLE} WHERE pattern_id = %s'
+)
+
+
+def db_id(pattern_id):
+    '''converts a pattern id to the form the database stores it in'''
+    return Pattern._meta.pk.get_db_prep_value(pattern_id, connection)
+
+
+def tokenize(query):
+    '''splits a search query into lowercase word tokens'''
+    return re.findall(r'\w+', query.lower())
+
+
+def index_pattern(pattern):
+    '''adds or replaces a pattern in the sqlite full-text index (postgresql keeps its index up to date itself)'''
+    if connection.vendor != 'sqlite':
+        return
+    pattern_id = db_id(pattern.id)
+    with connection.cursor() as cursor:
+        cursor.execute(NUMBER_SQL, [pattern_id])
+        cursor.execute(INDEX_SQL, [pattern.name, pattern.description, pattern_id])
+
+
+def index_new_patterns(patterns):
+    '''adds patterns that aren't in the sqlite full-text index yet (for patterns written with bulk_create,
+    which sends no signals)'''
+    if connection.vendor != 'sqlite':
+        return
+    rows = [(pattern.name, pattern.description, db_id(pattern.id)) for pattern in patterns]
+    with connection.cursor() as cursor:
+        cursor.executemany(NUMBER_SQL, [[pattern_id] for _, _, pattern_id in rows])
+        cursor.executemany(INDEX_SQL, rows)
+
+
+def unindex_pattern(pattern):
+    '''removes a deleted pattern from the sqlite full-text index'''
+    if connection.vendor != 'sqlite':
+        return
+    pattern_id = db_id(pattern.id)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM {FTS_IDS_TABLE} WHERE pattern_id = %s)', [pattern_id])
+        cursor.execute(f'DELETE FROM {FTS_IDS_TABLE} WHERE pattern_id = %s', [pattern_id])
+
+
+def matching_sql(tokens, user, difficulty):
+    '''builds the query for every pattern matching all of the tokens (as word prefixes), as rows of (id, score)
+
+    a lower score is a better match: sqlite's bm25 already works that way and postgresql's ts_rank is negated'''
+    if connection.vendor == 'sqlite':
+        # the name column is weighted above the description
+        sql = (
+            f'SELECT p.id AS id, f.score AS score FROM ('
+            f'SELECT pattern_id, bm25({FTS_TABLE}, 4.0, 1.0) AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+            f') f JOIN project_app_pattern p ON p.id = f.pattern_id WHERE p.creator_id != %s'
+        )
+        params = [' '.join(f'"{token}"*' for token in tokens), db_id(user.id)]
+    else:
+        query = ' & '.join(f'{token}:*' for token in tokens)
+        sql = (
+            f"SELECT p.id AS id, -ts_rank({PG_DOCUMENT}, to_tsquery('english', %s)) AS score FROM project_app_pattern p "
+            f"WHERE {PG_DOCUMENT} @@ to_tsquery('english', %s) AND p.creator_id != %s"
+        )
+        params = [query, query, db_id(user.id)]
+    if difficulty:
+        sql += ' AND p.difficulty = %s'
+        params.append(difficulty)
+    return sql, params
+
+
+def search_patterns(request, user, search_query, difficulty=None):
+    '''returns one page of the patterns matching the search query, best match first (a list), and the
+    cursor for the next page; the user's own patterns are left out'''
+    tokens = tokenize(search_query)
+    if not tokens:
+        return [], None
+    limit = get_limit(request)
+    sql, params = matching_sql(tokens, user, difficulty)
+    sql = f'SELECT id, score FROM ({sql}) m'
+
+    # continue after the (score, id) of the last pattern the client has seen
+    cursor = request.GET.get('cursor')
+    if cursor:
+        score, last_id = decode_cursor(cursor, 2)
+        try:
+            score, last_id = float(score), db_id(Pattern._meta.pk.to_python(last_id))
+        except (ValueError, ValidationError):
+            raise InvalidCursor({'cursor': 'invalid cursor'})
+        sql += ' WHERE score > %s OR (score = %s AND id > %s)'
+        params += [score, score, last_id]
+
+    # fetch one extra row to find out whether there is a next page
+    sql += ' ORDER BY score, id LIMIT %s'
+    params.append(limit + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = [(Pattern._meta.pk.to_python(row_id), score) for row_id, score in db_cursor.fetchall()]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][1], rows[-1][0]])
+
+    # load the patterns (with their creators) in one query and put them back in rank order
+    patterns = with_user_summary(Pattern.objects, 'creator').in_bulk([row_id for row_id, _ in rows])
+    return [patterns[row_id] for row_id, _ in rows if row_id in patterns], next_cursor
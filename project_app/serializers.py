@@ -4,23 +4,67 @@
 
 from rest_framework import serializers
 
-from .models import Post, User, InventoryItem, Pattern, Follow
+from .models import Post, User, InventoryItem, Pattern, Follow, Suggestion
 from dj_rest_auth.registration.serializers import RegisterSerializer
 from django.conf import settings
+from django.db import IntegrityError, transaction
 
+from .images import preferred_format
+
+
+
+def image_format(serializer):
+    '''the image format (webp or jpeg) to send urls for, chosen from the Accept header of the request in the serializer's context'''
+    return preferred_format(serializer.context.get('request'))
 
 
 class UserSerializer(serializers.ModelSerializer):
     avatar = serializers.SerializerMethodField() 
+    avatar_sizes = serializers.SerializerMethodField()
+    class Meta:
+        model = User
+        # the permission m2m fields cost two extra queries for every user serialized, and the password hash and
+        # permission flags must never leave the server
+        exclude = ['password', 'is_superuser', 'is_staff', 'last_login', 'groups', 'user_permissions', 'avatar_variants', 'follow_version']
+        # the counters are maintained by counters.py, never written by clients
+        read_only_fields = ['follower_count', 'following_count']
+
+    def get_avatar(self, obj):
+        if obj.avatar:
+            return f"{settings.WEBSITE_URL}{obj.avatar.url}"
+        return None
+
+    def get_avatar_sizes(self, obj):
+        return obj.avatar_sizes(image_format(self))
+
+
+# the user columns UserSummarySerializer reads; list querysets load only these (see with_user_summary)
+USER_SUMMARY_COLUMNS = ['id', 'username', 'name', 'avatar', 'avatar_variants']
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    '''the compact user embedded in list payloads (posts, patterns, inventory, follows, user search)'''
+    avatar = serializers.SerializerMethodField()
+    avatar_sizes = serializers.SerializerMethodField()
     class Meta:
         model = User
-        fields = '__all__'
+        fields = ['id', 'username', 'name', 'avatar', 'avatar_sizes']
 
     def get_avatar(self, obj):
         if obj.avatar:
             return f"{settings.WEBSITE_URL}{obj.avatar.url}"
         return None
 
+    def get_avatar_sizes(self, obj):
+        return obj.avatar_sizes(image_format(self))
+
+
+def with_user_summary(queryset, relation):
+    '''select_related()s the user at relation (e.g. 'user' or 'post__user'), reading only the columns
+    UserSummarySerializer needs instead of the whole user row'''
+    deferred = [f'{relation}__{field.name}' for field in User._meta.concrete_fields if field.name not in USER_SUMMARY_COLUMNS]
+    return queryset.select_related(relation).defer(*deferred)
+
 
 class CustomRegisterSerializer(RegisterSerializer):
     name = serializers.CharField(max_length=100)
@@ -30,23 +74,32 @@ class CustomRegisterSerializer(RegisterSerializer):
         # Set the username field explicitly during signup
         user.name = self.validated_data.get('name', '')
         user.username = self.validated_data.get('username', '')
-        user.save(update_fields=['name', 'username'])
+        user.save(update_fields=['name', 'username', 'updated_at'])
 
 class PostListSerializer(serializers.ModelSerializer):
-    user_info = UserSerializer(source='user',read_only=True)
+    user_info = UserSummarySerializer(source='user',read_only=True)
+    image_sizes = serializers.SerializerMethodField()
     class Meta:
         model = Post
         fields = [
             'id',
             'user_info',
             'image_url',
+            'image_sizes',
             'created_at',
             'caption',
             'pattern',
+            'like_count',
+            'comment_count',
+            'save_count',
         ]
 
+    def get_image_sizes(self, obj):
+        return obj.image_sizes(image_format(self))
+
 class PatternListSerializer(serializers.ModelSerializer):
-    creator_info = UserSerializer(source='creator',read_only=True)
+    creator_info = UserSummarySerializer(source='creator',read_only=True)
+    image_sizes = serializers.SerializerMethodField()
     class Meta:
         model = Pattern
         fields = [
@@ -57,21 +110,31 @@ class PatternListSerializer(serializers.ModelSerializer):
             'description',
             'created_at',
             'image_url',
+            'image_sizes',
+            'save_count',
         ]
 
+    def get_image_sizes(self, obj):
+        return obj.image_sizes(image_format(self))
+
 class InventoryListSerializer(serializers.ModelSerializer):
-    user_info = UserSerializer(source='user',read_only=True)
+    user_info = UserSummarySerializer(source='user',read_only=True)
+    image_sizes = serializers.SerializerMethodField()
     class Meta:
         model = InventoryItem
         fields = [
             'id',
             'image_url',
+            'image_sizes',
             'description',
             'item_type',
             'user_info',
             'name',
         ]
 
+    def get_image_sizes(self, obj):
+        return obj.image_sizes(image_format(self))
+
 class PostCreateSerializer(serializers.ModelSerializer):
     user = serializers.UUIDField(write_only=True)
 
@@ -116,6 +179,13 @@ class InventoryCreateSerializer(serializers.ModelSerializer):
         except User.DoesNotExist:
             raise serializers.ValidationError({"user_uuid": "Invalid user UUID."})
         
+class InventoryImportRowSerializer(serializers.Serializer):
+    '''validates one row of a bulk inventory import; image names a file uploaded alongside the rows'''
+    name = serializers.CharField(max_length=100)
+    item_type = serializers.ChoiceField(choices=InventoryItem.ITEM_TYPES)
+    description = serializers.CharField(allow_blank=True, required=False, default='')
+    image = serializers.CharField(allow_blank=True, required=False, default='')
+
 class PatternCreateSerializer(serializers.ModelSerializer):
     creator = serializers.UUIDField(write_only=True)
 
@@ -150,6 +220,8 @@ class FollowCreateSerializer(serializers.ModelSerializer):
             'follower',  # Hidden and populated from request.user
             'following',  # Required field
         ]
+        # no unique together check: it would cost a query and still race, so create() leaves it to the constraint
+        validators = []
 
     def create(self, validated_data):
         print('validated_data:', validated_data)
@@ -160,14 +232,16 @@ class FollowCreateSerializer(serializers.ModelSerializer):
         if follower == following:
             raise serializers.ValidationError({"following": "You cannot follow yourself."})
 
-        # Ensure a duplicate follow relationship does not exist
-        if Follow.objects.filter(follower=follower, following=following).exists():
+        # a single insert, which the unique constraint rejects if the follow already exists (even one made by a
+        # parallel request); the savepoint keeps the caller's transaction usable when it does
+        try:
+            with transaction.atomic():
+                return Follow.objects.create(**validated_data)
+        except IntegrityError:
             raise serializers.ValidationError({"detail": "You are already following this user."})
-
-        return Follow.objects.create(**validated_data)
     
 class FollowerListSerializer(serializers.ModelSerializer):
-    follow_info = UserSerializer(source='follower',read_only=True)
+    follow_info = UserSummarySerializer(source='follower',read_only=True)
 
     class Meta:
         model = Follow
@@ -176,7 +250,7 @@ class FollowerListSerializer(serializers.ModelSerializer):
             'follow_info',
         ]
 class FollowingListSerializer(serializers.ModelSerializer):
-    follow_info = UserSerializer(source='following',read_only=True)
+    follow_info = UserSummarySerializer(source='following',read_only=True)
 
     class Meta:
         model = Follow
@@ -186,3 +260,14 @@ class FollowingListSerializer(serializers.ModelSerializer):
         ]
 
         
+
+class SuggestionListSerializer(serializers.ModelSerializer):
+    suggested_info = UserSummarySerializer(source='suggested', read_only=True)
+
+    class Meta:
+        model = Suggestion
+        fields = [
+            'suggested_info',
+            'mutual_count',
+            'score',
+        ]
@@ -0,0 +1,233 @@
+# File: signals.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the signal receivers that keep derived data (timelines, etc.) in sync with the models
+
+from django.db import transaction
+from django.db.models import F
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import authentication, counters, explore, graph, images, jobs, response_cache, search, suggestions, timeline, typeahead
+from .models import Post, Follow, Like, Comment, SavedPost, SavedPattern, Pattern, User, InventoryItem
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    '''delivers new posts to timelines and the explore pool (created_at never changes, so neither do the entries' copies of it)'''
+    if created:
+        # the author's own timeline is written now, the followers' timelines by a background job
+        timeline.deliver_to_author(instance)
+        jobs.enqueue('timeline.fan_out_post', {'post_id': str(instance.id)}, priority=10, key=f'fan_out_post:{instance.id}')
+        explore.add_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    '''counts a new follow, and backfills the follower's timeline with the recent posts of the user they followed (in a background job)'''
+    if created:
+        counters.relationship_changed(instance, 1)
+        graph.edge_changed(instance.follower_id, instance.following_id, True)
+        suggestions.request_refresh(instance.follower_id)
+        User.objects.filter(pk=instance.follower_id).update(follow_version=F('follow_version') + 1)
+        # the cached user has the old follow_version, which the following feed's etag is made from
+        authentication.forget_user(instance.follower_id)
+        jobs.enqueue(
+            'timeline.backfill_follow',
+            {'follower_id': str(instance.follower_id), 'following_id': str(instance.following_id)},
+            priority=10, key=f'backfill_follow:{instance.id}',
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    '''uncounts a removed follow and takes the unfollowed user's posts back out of the follower's timeline'''
+    counters.relationship_changed(instance, -1)
+    graph.edge_changed(instance.follower_id, instance.following_id, False)
+    suggestions.request_refresh(instance.follower_id)
+    timeline.remove_follow(instance.follower_id, instance.following_id)
+    User.objects.filter(pk=instance.follower_id).update(follow_version=F('follow_version') + 1)
+    authentication.forget_user(instance.follower_id)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=SavedPost)
+def engagement_saved(sender, instance, created, **kwargs):
+    '''counts a new like, comment or save, and re-ranks the post in the explore pool'''
+    if created:
+        counters.relationship_changed(instance, 1)
+        explore.rescore_post(instance.post_id)
+        response_cache.invalidate(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=SavedPost)
+def engagement_deleted(sender, instance, **kwargs):
+    '''uncounts a removed like, comment or save, and re-ranks the post in the explore pool'''
+    counters.relationship_changed(instance, -1)
+    explore.rescore_post(instance.post_id)
+    response_cache.invalidate(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=SavedPattern)
+def pattern_save_saved(sender, instance, created, **kwargs):
+    '''counts a new save of a pattern'''
+    if created:
+        counters.relationship_changed(instance, 1)
+        response_cache.invalidate(f'pattern:{instance.pattern_id}')
+
+
+@receiver(post_delete, sender=SavedPattern)
+def pattern_save_deleted(sender, instance, **kwargs):
+    '''uncounts a removed save of a pattern'''
+    counters.relationship_changed(instance, -1)
+    response_cache.invalidate(f'pattern:{instance.pattern_id}')
+
+
+@receiver(post_save, sender=Pattern)
+def pattern_saved(sender, instance, **kwargs):
+    '''keeps the full-text search index in step with the pattern's name and description'''
+    search.index_pattern(instance)
+
+
+@receiver(post_delete, sender=Pattern)
+def pattern_deleted(sender, instance, **kwargs):
+    '''removes a deleted pattern from the full-text search index'''
+    search.unindex_pattern(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    '''re-indexes a user for typeahead search when their username or name may have changed'''
+    if update_fields is None or {'username', 'name'} & set(update_fields):
+        typeahead.index_user(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Pattern)
+@receiver(post_save, sender=InventoryItem)
+def image_saved(sender, instance, **kwargs):
+    '''queues the generation of the resized copies of a newly uploaded post, pattern or inventory image'''
+    enqueue_derivatives(instance, 'image', 'image_variants')
+
+
+@receiver(post_save, sender=User)
+def avatar_saved(sender, instance, **kwargs):
+    '''queues the generation of the resized copies of a newly uploaded avatar'''
+    enqueue_derivatives(instance, 'avatar', 'avatar_variants')
+
+
+def enqueue_derivatives(instance, field, variants_field):
+    '''adds a background job to resize an image, if it has changed since its derivatives were made'''
+    fieldfile = getattr(instance, field)
+    if not images.needs_derivatives(fieldfile, getattr(instance, variants_field)):
+        return
+    jobs.enqueue(
+        'images.refresh_derivatives',
+        {'model': instance._meta.label, 'pk': str(instance.pk), 'field': field, 'variants_field': variants_field},
+        priority=5, key=f'derivatives:{instance._meta.label}:{instance.pk}:{fieldfile.name}',
+    )
+
+
+# each model with an image: (image field, variants field)
+IMAGE_FIELDS = {
+    Post: ('image', 'image_variants'),
+    Pattern: ('image', 'image_variants'),
+    InventoryItem: ('image', 'image_variants'),
+    User: ('avatar', 'avatar_variants'),
+}
+
+
+@receiver(post_init, sender=Post)
+@receiver(post_init, sender=Pattern)
+@receiver(post_init, sender=InventoryItem)
+@receiver(post_init, sender=User)
+def image_loaded(sender, instance, **kwargs):
+    '''remembers which file an image field held when the object was loaded, so a replaced file can be released'''
+    field, _ = IMAGE_FIELDS[sender]
+    # read the raw value, so loading a deferred field doesn't cost a query per object; it is a
+    # string for objects loaded from the database and a file for new uploads, which aren't stored yet
+    name = instance.__dict__.get(field)
+    instance._stored_image = name if isinstance(name, str) else None
+
+
+def release_files(storage, names):
+    '''drops the references to stored files once the transaction commits, so a rolled back save can't
+    delete a file that is still used'''
+    names = [name for name in names if name]
+    def release():
+        for name in names:
+            storage.delete(name)
+    if names:
+        transaction.on_commit(release)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Pattern)
+@receiver(pre_save, sender=InventoryItem)
+@receiver(pre_save, sender=User)
+def image_saving(sender, instance, **kwargs):
+    '''notes whether this save stores a new upload, which counts a reference even when its bytes (and
+    so its name) are the same as the file it replaces'''
+    field, _ = IMAGE_FIELDS[sender]
+    fieldfile = getattr(instance, field) if field in instance.__dict__ else None
+    instance._uploading_image = bool(fieldfile) and not fieldfile._committed
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Pattern)
+@receiver(post_save, sender=InventoryItem)
+@receiver(post_save, sender=User)
+def image_replaced(sender, instance, **kwargs):
+    '''releases the stored file an image field pointed to before it was replaced or cleared'''
+    field, _ = IMAGE_FIELDS[sender]
+    if field not in instance.__dict__:
+        return
+    fieldfile = getattr(instance, field)
+    old_name = getattr(instance, '_stored_image', None)
+    # a new upload of the same bytes gets the old name back, but was still counted as another reference
+    if old_name and (old_name != fieldfile.name or getattr(instance, '_uploading_image', False)):
+        release_files(fieldfile.storage, [old_name])
+    instance._stored_image = fieldfile.name
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Pattern)
+@receiver(post_delete, sender=InventoryItem)
+@receiver(post_delete, sender=User)
+def image_deleted(sender, instance, **kwargs):
+    '''releases a deleted object's image and its resized copies'''
+    field, variants_field = IMAGE_FIELDS[sender]
+    fieldfile = getattr(instance, field)
+    release_files(fieldfile.storage, [fieldfile.name, *images.derivative_names(getattr(instance, variants_field))])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Pattern)
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Follow)
+@receiver(post_save, sender=InventoryItem)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Pattern)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=InventoryItem)
+def cached_responses_changed(sender, instance, **kwargs):
+    '''invalidates the cached responses that show an object that was saved or deleted'''
+    response_cache.invalidate(*response_cache.tags_for(instance))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_tokens_changed(sender, instance, **kwargs):
+    '''drops the cached tokens of a user who was edited (a new avatar, deactivated, a new password) or deleted'''
+    authentication.forget_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def user_logged_out_tokens(sender, user, **kwargs):
+    '''drops the cached tokens of a user who logged out'''
+    if user is not None:
+        authentication.forget_user(user.pk)
@@ -0,0 +1,108 @@
+# File: storage.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the content addressed media storage: every upload is stored under the
+# sha256 of its bytes, so identical uploads share one file, which is reference counted and deleted
+# when nothing uses it anymore
+
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+
+# the folder all the hashed files are stored in
+BLOB_DIR = 'blobs'
+# how much of a file is read at a time while hashing it
+CHUNK_SIZE = 64 * 1024
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    '''a file system storage that names each file by the hash of its contents
+
+    the name passed to save() only contributes its extension; uploads of the same bytes get the same
+    name, and a MediaBlob row counts how many saved references each file has'''
+
+    def blob_name(self, digest, name):
+        '''the storage name for a file with the given hash, e.g. blobs/3f/3fa9...c1.png'''
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(BLOB_DIR, digest[:2], digest + extension)
+
+    def is_blob(self, name):
+        '''true when a name is one of this storage's hashed files (older uploads have their original names)'''
+        return bool(name) and name.replace('\\', '/').startswith(BLOB_DIR + '/')
+
+    def get_available_name(self, name, max_length=None):
+        # the real name is only known once the file has been hashed in _save
+        return name
+
+    def _save(self, name, content):
+        '''hashes the file while copying it to a temporary file (reading it in chunks, so it is never fully
+        in memory; a large upload, already on disk, is moved instead of copied), then either keeps the copy as a new blob or drops it and adds a reference to the
+        existing blob with the same hash'''
+        os.makedirs(self.path(BLOB_DIR), exist_ok=True)
+        temporary = self.path(posixpath.join(BLOB_DIR, f'.{uuid.uuid4().hex}.tmp'))
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                # an upload django already spooled to disk is hashed where it is and moved, not copied
+                with open(content.temporary_file_path(), 'rb') as source:
+                    while chunk := source.read(CHUNK_SIZE):
+                        digest.update(chunk)
+                        size += len(chunk)
+                file_move_safe(content.temporary_file_path(), temporary, allow_overwrite=True)
+            else:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                with open(temporary, 'wb') as destination:
+                    for chunk in content.chunks():
+                        if isinstance(chunk, str):
+                            chunk = chunk.encode()
+                        digest.update(chunk)
+                        destination.write(chunk)
+                        size += len(chunk)
+            digest = digest.hexdigest()
+            name = self.blob_name(digest, name)
+
+            # count the reference first, so a concurrent delete of the last reference can't remove the file after we checked for it
+            add_reference(name, digest, size)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                return name
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(temporary, full_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+            return name
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def delete(self, name):
+        '''drops one reference to a blob, removing the file once it has none left; files saved before this
+        storage was used are not reference counted and are deleted straight away'''
+        from .models import MediaBlob
+
+        if not name:
+            return
+        if not self.is_blob(name):
+            super().delete(name)
+            return
+        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') - 1)
+        deleted, _ = MediaBlob.objects.filter(name=name, refcount__lte=0).delete()
+        if deleted:
+            super().delete(name)
+
+
+def add_reference(name, digest, size):
+    '''counts one more reference to a blob, recording it if this is the first
+
+    the row is inserted with no references if it is missing (doing nothing when another upload of the
+    same bytes got there first) and then incremented, so concurrent uploads can't lose a count'''
+    from .models import MediaBlob
+
+    MediaBlob.objects.bulk_create([MediaBlob(name=name, digest=digest, size=size, refcount=0)], ignore_conflicts=True)
+    MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
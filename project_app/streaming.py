@@ -0,0 +1,77 @@
+# File: streaming.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the streaming mode of the list views: with ?stream=1 a list view sends every
+# row (from the cursor on) instead of one page, reading and serializing them a chunk at a time as they are sent
+# (over WSGI or ASGI)
+
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from .pagination import after_cursor, decode_cursor
+from .renderers import dumps
+
+# how many rows are read from the database and serialized at a time
+CHUNK_SIZE = getattr(settings, 'STREAM_CHUNK_SIZE', 500)
+
+
+def wants_stream(request):
+    '''whether the client asked for the whole list to be streamed (?stream=1)'''
+    return request.GET.get('stream', '').lower() in ('1', 'true')
+
+
+def is_asgi(request):
+    '''whether the request is being served over ASGI (uvicorn) rather than WSGI'''
+    # a rest framework request wraps django's
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def async_chunks(chunks):
+    '''yields the chunks of a synchronous iterator one at a time, each read in the request's sync thread (where its
+    database cursor or open file lives), so the event loop isn't blocked and only one chunk is held at a time'''
+    done = object()
+    read = sync_to_async(next)
+    while (chunk := await read(chunks, done)) is not done:
+        yield chunk
+
+
+def stream_for_server(request, response):
+    '''makes a streaming response stream under ASGI too: there, django reads a synchronous iterator to the end
+    (into a list) before sending anything, so it is given an asynchronous one instead; the response still closes
+    the original iterator (its database cursor or file) when it is closed'''
+    if is_asgi(request):
+        response.streaming_content = async_chunks(iter(response.streaming_content))
+    return response
+
+
+def encode_rows(request, rows, serializer_class, chunk_size):
+    '''yields the {"data": [...], "next_cursor": null} envelope a piece at a time, one piece per chunk of rows'''
+    context = {'request': request}
+    yield b'{"data":['
+    first = True
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        data = serializer_class(chunk, many=True, context=context).data
+        # the rows of the chunk, without the list's own brackets
+        body = b','.join(dumps(row) for row in data)
+        yield body if first else b',' + body
+        first = False
+    yield b'],"next_cursor":null}'
+
+
+def stream_list(request, queryset, serializer_class, ordering=('-created_at', '-id'), chunk_size=CHUNK_SIZE):
+    '''a response streaming every row of the queryset in the same order (and after the same cursor) as
+    paginate, so a worker's memory stays the same however many rows there are'''
+    queryset = queryset.order_by(*ordering)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        queryset = after_cursor(queryset, ordering, decode_cursor(cursor, len(ordering)))
+    # iterator() reads the rows through a database cursor, chunk_size at a time, without caching them on the queryset
+    rows = queryset.iterator(chunk_size=chunk_size)
+    response = StreamingHttpResponse(encode_rows(request, rows, serializer_class, chunk_size), content_type='application/json')
+    return stream_for_server(request, response)
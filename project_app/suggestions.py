@@ -0,0 +1,129 @@
+# File: suggestions.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the "people you may know" engine: suggestions are computed offline (by the
+# compute_suggestions command) from the follow graph and pattern activity, and stored for the api to page through
+
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import graph
+from .models import Pattern, SavedPattern, Suggestion, SuggestionRefresh, User
+
+# how many suggestions are stored per user
+SUGGESTION_COUNT = getattr(settings, 'SUGGESTION_COUNT', 50)
+# at most this many of the accounts a user follows are walked to find friends of friends, so a user who
+# follows thousands of accounts costs no more than one who follows a few hundred
+MAX_FOLLOWING_WALKED = 500
+# how much each signal counts towards a suggestion's score
+MUTUAL_WEIGHT = 1.0
+DIFFICULTY_WEIGHT = 2.0
+ENGAGEMENT_WEIGHT = 0.5
+
+BATCH_SIZE = 500
+
+
+def request_refresh(user_id):
+    '''marks a user's neighborhood as changed, so the next incremental run recomputes the suggestions
+    of the user and of everyone who follows them'''
+    SuggestionRefresh.objects.bulk_create(
+        [SuggestionRefresh(user_id=user_id, requested_at=timezone.now())],
+        update_conflicts=True, unique_fields=['user'], update_fields=['requested_at'],
+    )
+
+
+def difficulty_profiles(user_ids):
+    '''returns {user id: set of difficulties} of the patterns each user has made or saved'''
+    profiles = defaultdict(set)
+    for user_id, difficulty in Pattern.objects.filter(creator__in=user_ids).values_list('creator', 'difficulty').distinct():
+        profiles[user_id].add(difficulty)
+    saved = SavedPattern.objects.filter(user__in=user_ids).values_list('user', 'pattern__difficulty').distinct()
+    for user_id, difficulty in saved:
+        profiles[user_id].add(difficulty)
+    return profiles
+
+
+def mutual_counts(follow_graph, user_id, popular):
+    '''returns {candidate id: number of the user's follows who follow them} for the user's friends of friends,
+    topped up with popular accounts (with no mutuals) for users who follow few people'''
+    following = follow_graph.following(user_id)
+    mutuals = Counter()
+    for followed in islice(following, MAX_FOLLOWING_WALKED):
+        mutuals.update(follow_graph.following(followed))
+    for candidate in popular:
+        if len(mutuals) >= SUGGESTION_COUNT:
+            break
+        mutuals.setdefault(candidate, 0)
+    # never suggest the user themselves or someone they already follow
+    mutuals.pop(user_id, None)
+    for followed in following:
+        mutuals.pop(followed, None)
+    return mutuals
+
+
+def score(mutuals, shared_difficulty, follower_count):
+    '''combines the number of mutual follows, how much of the candidate's pattern difficulty the user shares
+    (0 to 1), and how followed the candidate is'''
+    return MUTUAL_WEIGHT * mutuals + DIFFICULTY_WEIGHT * shared_difficulty + ENGAGEMENT_WEIGHT * math.log1p(follower_count)
+
+
+def compute_batch(follow_graph, user_ids, popular):
+    '''recomputes and stores the suggestions of a batch of users, returning how many were stored'''
+    candidates = {user_id: mutual_counts(follow_graph, user_id, popular) for user_id in user_ids}
+    candidate_ids = set().union(*candidates.values()) if candidates else set()
+    follower_counts = dict(User.objects.filter(id__in=candidate_ids).values_list('id', 'follower_count'))
+    profiles = difficulty_profiles(set(user_ids) | candidate_ids)
+
+    suggestions = []
+    for user_id, mutuals in candidates.items():
+        own = profiles.get(user_id, set())
+        scored = []
+        for candidate, mutual_count in mutuals.items():
+            if candidate not in follower_counts:
+                # the account was deleted after the graph was built
+                continue
+            theirs = profiles.get(candidate, set())
+            shared = len(own & theirs) / len(theirs) if theirs else 0
+            scored.append((score(mutual_count, shared, follower_counts[candidate]), mutual_count, candidate))
+        for value, mutual_count, candidate in heapq.nlargest(SUGGESTION_COUNT, scored, key=lambda row: row[0]):
+            suggestions.append(Suggestion(user_id=user_id, suggested_id=candidate, mutual_count=mutual_count, score=value))
+
+    with transaction.atomic():
+        Suggestion.objects.filter(user__in=user_ids).delete()
+        Suggestion.objects.bulk_create(suggestions, batch_size=BATCH_SIZE)
+    return len(suggestions)
+
+
+def users_to_refresh(follow_graph, requested_before):
+    '''the users whose suggestions may have changed: everyone whose follows changed, and their followers'''
+    changed = SuggestionRefresh.objects.filter(requested_at__lte=requested_before).values_list('user', flat=True)
+    users = set()
+    for user_id in changed:
+        users.add(user_id)
+        users |= follow_graph.followers(user_id)
+    return users
+
+
+def compute(everyone=False):
+    '''recomputes the suggestions of the users whose neighborhood changed (or of every user), returning
+    (users recomputed, suggestions stored)'''
+    started = timezone.now()
+    # a fresh graph, so the results don't depend on how current this process's graph is
+    follow_graph = graph.build()
+    popular = list(User.objects.order_by('-follower_count').values_list('id', flat=True)[:SUGGESTION_COUNT * 2])
+    if everyone:
+        user_ids = list(User.objects.values_list('id', flat=True))
+    else:
+        user_ids = list(users_to_refresh(follow_graph, started))
+
+    stored = 0
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        stored += compute_batch(follow_graph, user_ids[start:start + BATCH_SIZE], popular)
+    # changes requested while this ran are left for the next run
+    SuggestionRefresh.objects.filter(requested_at__lte=started).delete()
+    return len(user_ids), stored
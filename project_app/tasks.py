@@ -0,0 +1,32 @@
+# File: tasks.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the background tasks run by the job queue (see jobs.py)
+
+from django.apps import apps
+
+from . import images, timeline
+from .jobs import task
+from .models import Post
+
+
+@task('images.refresh_derivatives')
+def refresh_derivatives(model, pk, field, variants_field):
+    '''generates the resized copies of an uploaded image'''
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    # the object may have been deleted since the job was enqueued
+    if instance is not None:
+        images.refresh_derivatives(instance, field, variants_field)
+
+
+@task('timeline.fan_out_post')
+def fan_out_post(post_id):
+    '''delivers a new post to its author's followers' timelines'''
+    post = Post.objects.filter(id=post_id).only('id', 'user_id', 'created_at').first()
+    if post is not None:
+        timeline.fan_out_post(post)
+
+
+@task('timeline.backfill_follow')
+def backfill_follow(follower_id, following_id):
+    '''copies a newly followed user's recent posts into the follower's timeline'''
+    timeline.backfill_follow(follower_id, following_id)
@@ -0,0 +1,153 @@
+# File: timeline.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the materialized home timeline: posts are copied into their
+# author's followers' timelines when they are written, so reading the home feed is one index scan
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Follow, Post, TimelineEntry, User
+from . import graph
+from .conditional import window_summary
+from .pagination import after_cursor, cursor_values, decode_cursor, encode_cursor, get_limit
+from .serializers import with_user_summary
+
+# authors with more followers than this are not fanned out on write; their posts are
+# merged into their followers' timelines when the timeline is read instead
+FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+# how many of a user's recent posts are copied into a new follower's timeline
+BACKFILL_SIZE = getattr(settings, 'TIMELINE_BACKFILL_SIZE', 100)
+# how long the set of popular authors is cached for
+POPULAR_AUTHORS_TIMEOUT = 600
+
+BATCH_SIZE = 1000
+ENTRY_ORDERING = ('-created_at', '-post_id')
+ENTRY_UPDATED = ('post__updated_at', 'post__user__updated_at')
+POST_ORDERING = ('-created_at', '-id')
+
+
+def popular_authors():
+    '''returns the set of ids of users with more followers than the fan-out limit'''
+    authors = cache.get('timeline:popular_authors')
+    if authors is None:
+        authors = set(User.objects.filter(follower_count__gt=FANOUT_LIMIT).values_list('id', flat=True))
+        cache.set('timeline:popular_authors', authors, POPULAR_AUTHORS_TIMEOUT)
+    return authors
+
+
+def entry_for(user_id, post):
+    '''builds (without saving) the timeline entry delivering a post to a user'''
+    return TimelineEntry(user_id=user_id, post_id=post.id, author_id=post.user_id, created_at=post.created_at)
+
+
+def deliver_to_author(post):
+    '''puts a new post on its author's own timeline (done during the request, so the author sees it straight away)'''
+    TimelineEntry.objects.bulk_create([entry_for(post.user_id, post)], ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    '''delivers a new post to its author's timeline and, unless the author is popular, to all of their followers'''
+    entries = [entry_for(post.user_id, post)]
+    if post.user_id not in popular_authors():
+        followers = Follow.objects.filter(following=post.user_id).values_list('follower', flat=True)
+        entries += [entry_for(follower, post) for follower in followers.iterator()]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def backfill_follow(follower_id, following_id):
+    '''copies the recent posts of a newly followed user into the follower's timeline'''
+    if following_id in popular_authors():
+        return
+    posts = Post.objects.filter(user=following_id).order_by(*POST_ORDERING)[:BACKFILL_SIZE]
+    entries = [entry_for(follower_id, post) for post in posts.only('id', 'user_id', 'created_at')]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def remove_follow(follower_id, following_id):
+    '''removes an unfollowed user's posts from the follower's timeline'''
+    TimelineEntry.objects.filter(user=follower_id, author=following_id).delete()
+
+
+def rebuild(users):
+    '''regenerates the timelines of the given users (a batch of them) from the Post and Follow tables: each gets
+    their own posts and the recent posts of the authors they follow (but not the popular authors)'''
+    popular = popular_authors()
+    user_ids = [user.id for user in users]
+    authors = {user_id: [user_id] for user_id in user_ids}
+    for follower, author in Follow.objects.filter(follower__in=user_ids).values_list('follower', 'following'):
+        if author not in popular:
+            authors[follower].append(author)
+    posts = recent_posts({author for followed in authors.values() for author in followed})
+
+    entries = [
+        entry_for(user_id, post)
+        for user_id, followed in authors.items() for author in followed for post in posts.get(author, [])
+    ]
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user__in=user_ids).delete()
+        TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def recent_posts(author_ids):
+    '''returns {author id: their BACKFILL_SIZE most recent posts}, with one query per BATCH_SIZE authors'''
+    author_ids = list(author_ids)
+    posts = defaultdict(list)
+    for start in range(0, len(author_ids), BATCH_SIZE):
+        recent = (
+            Post.objects.filter(user__in=author_ids[start:start + BATCH_SIZE])
+            # each author's posts numbered newest first (in POST_ORDERING)
+            .annotate(position=Window(RowNumber(), partition_by=[F('user')], order_by=[F('created_at').desc(), F('id').desc()]))
+            .filter(position__lte=BACKFILL_SIZE)
+            .only('id', 'user_id', 'created_at')
+        )
+        for post in recent:
+            posts[post.user_id].append(post)
+    return posts
+
+
+def timeline_page(request, user):
+    '''returns one page of the user's home timeline (a list of posts) and the cursor for the next page'''
+    limit = get_limit(request)
+    cursor = request.GET.get('cursor')
+    values = decode_cursor(cursor, len(ENTRY_ORDERING)) if cursor else None
+
+    # the fanned out posts, one range scan over the user's timeline
+    entries = with_user_summary(TimelineEntry.objects.filter(user=user), 'post__user').order_by(*ENTRY_ORDERING)
+    if values:
+        entries = after_cursor(entries, ENTRY_ORDERING, values)
+    posts = [entry.post for entry in entries[:limit + 1]]
+
+    # merge in the posts of followed authors that are too popular to fan out
+    popular = popular_authors()
+    followed = graph.followed_among(user.id, popular) if popular else set()
+    if followed:
+        popular_posts = with_user_summary(Post.objects.filter(user__in=list(followed)), 'user').order_by(*POST_ORDERING)
+        if values:
+            popular_posts = after_cursor(popular_posts, POST_ORDERING, values)
+        # an author may have become popular after some of their posts were fanned out
+        seen = {post.id for post in posts}
+        posts += [post for post in popular_posts[:limit + 1] if post.id not in seen]
+        posts.sort(key=lambda post: (post.created_at, post.id), reverse=True)
+
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_cursor(cursor_values(posts[-1], POST_ORDERING))
+    return posts, next_cursor
+
+
+def timeline_summaries(request, user):
+    '''summarizes the requested page of the user's home timeline for conditional requests (see conditional.py);
+    one aggregate query, plus one more if the user follows authors too popular to fan out'''
+    # the posts are shown, not the entries, so it is the posts and their authors whose edits count
+    summaries = [window_summary(request, TimelineEntry.objects.filter(user=user), ENTRY_ORDERING, ENTRY_UPDATED)]
+    popular = popular_authors()
+    followed = graph.followed_among(user.id, popular) if popular else set()
+    if followed:
+        summaries.append(window_summary(request, Post.objects.filter(user__in=list(followed)), POST_ORDERING))
+    return summaries
@@ -0,0 +1,139 @@
+# File: typeahead.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the typeahead index over usernames and names: word prefixes are
+# stored already ranked by follower count and substrings are found with trigrams, so it can run on every keystroke
+
+import re
+import time
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery
+
+from .models import User, UserSearchTerm
+from .serializers import USER_SUMMARY_COLUMNS
+
+# the longest term stored in the index (matches UserSearchTerm.term)
+MAX_TERM_LENGTH = 64
+# word prefixes up to this long get their own rows; longer queries match few enough words to rank them all
+PREFIX_LENGTH = getattr(settings, 'TYPEAHEAD_PREFIX_LENGTH', 10)
+# how often (in seconds) the worker copies follower counts onto the prefix rows
+RANK_INTERVAL = getattr(settings, 'TYPEAHEAD_RANK_INTERVAL', 300)
+# how many matching users are ranked for each kind of match before the top results are picked
+CANDIDATE_LIMIT = 100
+# default and maximum number of suggestions returned
+DEFAULT_RESULTS = 8
+MAX_RESULTS = 20
+
+
+def normalize(text):
+    '''lowercases text and collapses its whitespace'''
+    return ' '.join((text or '').lower().split())[:MAX_TERM_LENGTH]
+
+
+def words(user):
+    '''the terms a user can be found by the prefix of: their username, their full name, and each word of their name'''
+    name = normalize(user.name)
+    terms = {normalize(user.username), name}
+    terms.update(re.findall(r'\w+', name))
+    return {term for term in terms if term}
+
+
+def trigrams(text):
+    '''the set of three character substrings of the text'''
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def prefixes(terms):
+    '''the set of prefixes (up to PREFIX_LENGTH long) of the terms'''
+    return {term[:i] for term in terms for i in range(1, min(len(term), PREFIX_LENGTH) + 1)}
+
+
+def terms_for(user):
+    '''builds (without saving) all of the index rows for a user'''
+    terms = words(user)
+    rows = [UserSearchTerm(user=user, kind='word', term=term) for term in terms]
+    rows += [UserSearchTerm(user=user, kind='prefix', term=prefix, follower_count=user.follower_count) for prefix in prefixes(terms)]
+    grams = trigrams(normalize(user.username)) | trigrams(normalize(user.name))
+    rows += [UserSearchTerm(user=user, kind='trigram', term=gram) for gram in grams]
+    return rows
+
+
+def index_user(user):
+    '''replaces a user's rows in the typeahead index'''
+    UserSearchTerm.objects.filter(user=user).delete()
+    UserSearchTerm.objects.bulk_create(terms_for(user))
+
+
+# the candidates kept are the most followed matches, so the best results are never cut off
+RANKING = ('-user__follower_count', 'user__username')
+
+
+def ranked_prefix_rows(query, exclude_id):
+    '''the prefix rows for the query, read in rank order straight from user_search_rank_idx (there is one row
+    per user and prefix, so nothing needs sorting or de-duplicating)'''
+    terms = UserSearchTerm.objects.filter(kind='prefix', term=query).exclude(user=exclude_id)
+    return terms.order_by('kind', 'term', '-follower_count').values_list('user', flat=True)
+
+
+def prefix_matches(query, exclude_id):
+    '''ids of the most followed users with a word starting with the query'''
+    if len(query) <= PREFIX_LENGTH:
+        return list(ranked_prefix_rows(query, exclude_id)[:CANDIDATE_LIMIT])
+    # a range scan over the words: at this length only a handful of words match, so ranking them all is cheap
+    terms = UserSearchTerm.objects.filter(kind='word', term__gte=query, term__lt=query + '\uffff')
+    matches = terms.exclude(user=exclude_id).order_by(*RANKING).values_list('user', flat=True).distinct()
+    return list(matches[:CANDIDATE_LIMIT])
+
+
+def refresh_ranks():
+    '''copies each user's follower count onto their prefix rows where it has changed; returns the rows updated'''
+    current = User.objects.filter(pk=OuterRef('user')).values('follower_count')
+    stale = UserSearchTerm.objects.filter(kind='prefix').exclude(follower_count=F('user__follower_count'))
+    return stale.update(follower_count=Subquery(current))
+
+
+# when this process last refreshed the ranks
+last_refresh = float('-inf')
+
+
+def refresh():
+    '''refreshes the ranks of the prefix rows, at most every RANK_INTERVAL; called by the worker loop (between
+    refreshes, prefix candidates are picked with follower counts up to RANK_INTERVAL old, and suggest re-ranks
+    them with the current counts)'''
+    global last_refresh
+    if time.monotonic() - last_refresh < RANK_INTERVAL:
+        return 0
+    last_refresh = time.monotonic()
+    return refresh_ranks()
+
+
+def substring_matches(query, exclude_id):
+    '''ids of the most followed users whose username or name contains every trigram of the query'''
+    grams = trigrams(query)
+    terms = UserSearchTerm.objects.filter(kind='trigram', term__in=grams).exclude(user=exclude_id)
+    matches = terms.values('user').annotate(found=Count('term', distinct=True)).filter(found=len(grams)).order_by(*RANKING)
+    return [row['user'] for row in matches[:CANDIDATE_LIMIT]]
+
+
+def suggest(query, exclude_id, limit=DEFAULT_RESULTS):
+    '''returns the top users for a typeahead query: prefix matches first, then substring matches,
+    each ranked by follower count'''
+    query = normalize(query)
+    if not query:
+        return []
+
+    prefix_ids = set(prefix_matches(query, exclude_id))
+    substring_ids = set()
+    if len(prefix_ids) < limit and len(query) >= 3:
+        substring_ids = set(substring_matches(query, exclude_id)) - prefix_ids
+
+    # load the candidates (with their follower counts) in one query
+    users = User.objects.filter(id__in=prefix_ids | substring_ids).only(*USER_SUMMARY_COLUMNS, 'follower_count')
+    ranked = []
+    for user in users:
+        # trigrams can match text the query isn't actually in (e.g. 'abcab' has the trigrams of 'cabc')
+        if user.id not in prefix_ids and query not in normalize(user.username) and query not in normalize(user.name):
+            continue
+        ranked.append(user)
+    ranked.sort(key=lambda user: (user.id not in prefix_ids, -user.follower_count, user.username))
+    return ranked[:limit]
@@ -3,7 +3,7 @@
 # Description: a file containing all urls to call the api views for data fetching
 
 from django.urls import path
-from . import api
+from . import api, async_api
 
 from dj_rest_auth.jwt_auth import get_refresh_view
 from dj_rest_auth.views import LoginView, LogoutView
@@ -28,6 +28,8 @@ urlpatterns = [
 
     # user urls
     path('users/', api.search_users, name='api_search_user'),
+    path('users/typeahead/', api.typeahead_users, name='api_user_typeahead'),
+    path('users/suggestions/', api.get_user_suggestions, name='api_user_suggestions'),
     path('user/<str:user_id>', api.get_user_by_id, name='api_user_info'),
     path('user_posts/<str:user_id>', api.get_user_posts, name='api_user_post_list'),
     path('user_patterns/<str:user_id>', api.get_user_patterns, name='api_user_pattern_list'),
@@ -36,10 +38,21 @@ urlpatterns = [
     path('user/<str:user_id>/following', api.get_user_following, name='user_following'),
     path('user/<str:user_id>/followers', api.get_user_followers, name='user_followers'),
 
+    # async versions of the read-only urls, for the ASGI server (see async_api.py)
+    path('async/posts', async_api.get_all_posts, name='async_all_post_list'),
+    path('async/posts/following', async_api.get_following_posts, name='async_user_following_posts'),
+    path('async/posts/explore', async_api.get_explore_posts, name='async_user_explore_posts'),
+    path('async/pattern/<str:pattern_id>', async_api.get_pattern_by_id, name='async_pattern_info'),
+    path('async/user/<str:user_id>', async_api.get_user_by_id, name='async_user_info'),
+    path('async/user/<str:user_id>/following', async_api.get_user_following, name='async_user_following'),
+    path('async/user/<str:user_id>/followers', async_api.get_user_followers, name='async_user_followers'),
+
     # inventory urls
     path('inventory/<str:user_id>', api.get_inventory, name='user_inventory'),
     path('inventory/create_inventory/<str:user_id>', api.create_inventory_item, name='create_inventory_item'),
     path('inventory/delete_inventory/<str:inventory_id>', api.delete_inventory_item, name='delete_inventory_item'),
+    path('inventory/bulk/import', api.bulk_import_inventory, name='bulk_import_inventory'),
+    path('inventory/bulk/delete', api.bulk_delete_inventory, name='bulk_delete_inventory'),
 
     # authentication urls
     path('auth/register/', CustomRegisterView.as_view(), name='rest_register'),
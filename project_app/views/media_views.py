@@ -0,0 +1,156 @@
+# File: media_views.py
+# Author: Brinja Vogler (bvogler@bu.edu)
+# Description: a file containing the view that serves uploaded media, with validators so clients and caches
+# can reuse images, byte ranges, and an option to hand the file transfer off to the front proxy
+
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from project_app.storage import BLOB_DIR
+from project_app.streaming import stream_for_server
+
+# hashed uploads never change, so they can be cached for a year; older uploads are cached for a day
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=86400'
+# how the file transfer is handed to the front proxy: None (django sends the file), 'x-accel-redirect'
+# (nginx, which serves MEDIA_ACCEL_PREFIX as an internal location) or 'x-sendfile' (apache, lighttpd)
+MEDIA_ACCEL = getattr(settings, 'MEDIA_ACCEL', None)
+MEDIA_ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+CHUNK_SIZE = 64 * 1024
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def etag_for(path, stat):
+    '''a strong etag for a media file: the content hash for hashed uploads, else its modification time and size'''
+    if is_hashed(path):
+        return '"' + posixpath.splitext(posixpath.basename(path))[0] + '"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def is_hashed(path):
+    '''true for files stored under the hash of their contents, which never change'''
+    return path.startswith(BLOB_DIR + '/')
+
+
+def etag_matches(header, etag):
+    '''whether an If-None-Match header names the etag'''
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+def parse_range(header, size):
+    '''turns a Range header into the (start, end) byte positions it asks for (end included)
+
+    returns None when the whole file should be sent (no header, or one this view doesn't handle, such as
+    several ranges) and raises ValueError when the range lies outside the file'''
+    match = RANGE_PATTERN.match(header.replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # a suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError('empty range')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('unsatisfiable range')
+    return start, end
+
+
+def read_range(full_path, start, end):
+    '''streams the bytes from start to end of a file, a chunk at a time'''
+    with open(full_path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    '''serves an uploaded file with an etag and cache headers, answering conditional and range requests'''
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('media not found')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('media not found')
+    if not os.path.isfile(full_path):
+        raise Http404('media not found')
+
+    etag = etag_for(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if is_hashed(path) else DEFAULT_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+
+    # the client's copy is still current
+    if etag_matches(request.META.get('HTTP_IF_NONE_MATCH', ''), etag):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    # let the front proxy send the file (it handles ranges itself), so the worker is free straight away
+    if MEDIA_ACCEL in ('x-accel-redirect', 'x-sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if MEDIA_ACCEL == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + quote(path)
+        else:
+            response['X-Sendfile'] = full_path
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    # a range is only honored if the client's partial copy is of this same file
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if 'HTTP_RANGE' in request.META and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    if byte_range is None:
+        # under WSGI, FileResponse hands the open file to the server's file_wrapper (gunicorn's can use sendfile, so the
+        # bytes aren't copied through python); under ASGI it is read a chunk at a time in a thread (see stream_for_server)
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(read_range(full_path, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(end - start + 1)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for header, value in headers.items():
+        response[header] = value
+    return stream_for_server(request, response)